@@ -0,0 +1,242 @@
+"""Verification of API keys, sent as `Authorization: Bearer <key>`.
+
+Keys are random tokens, of which only the SHA-256 hash is stored in `api_key`. Once a
+key is verified, its `(user_id, level)` are cached in memory for `API_KEY_CACHE_TTL`
+seconds, so that authenticating a request usually takes a dictionary lookup. Changes
+to keys committed through the `APIKey` model, e.g. revocations, drop them from the
+cache of the process, and touch the file at `API_KEY_REVOCATION_PATH`: other worker
+processes on the host see its modification time change on their next verification,
+and clear their cache.
+"""
+
+import hashlib
+import os
+import secrets
+import tempfile
+import threading
+from functools import wraps
+from typing import NamedTuple, Optional
+
+import click
+from flask import Blueprint, g, request
+from flask_restful import abort
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from caching import LRUCache
+from models import db, APIKey, PermLevel
+
+
+DEFAULT_CACHE_SIZE = 10000
+"""Number of API keys whose credentials are kept in memory."""
+DEFAULT_CACHE_TTL = 300.0
+"""Seconds for which the credentials of an API key are kept in memory."""
+DEFAULT_REVOCATION_PATH = os.path.join(tempfile.gettempdir(), "api_key_revocations")
+"""File touched when API keys change, to notify other processes."""
+
+api_keys = Blueprint("api_keys", __name__, cli_group="keys")
+
+
+class Credentials(NamedTuple):
+    """What an API key grants access to."""
+
+    key_id: int
+    user_id: int
+    level: PermLevel
+
+
+_cache: LRUCache[str, Credentials] = LRUCache(DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL)
+_revocation_path = DEFAULT_REVOCATION_PATH
+_revocations_seen = 0
+_revocations_lock = threading.Lock()
+
+
+def configure(config):
+    """Apply the app's settings: `API_KEY_CACHE_SIZE`, `API_KEY_CACHE_TTL` and
+    `API_KEY_REVOCATION_PATH`.
+    """
+
+    global _revocation_path, _revocations_seen
+    _cache.max_size = int(config.get("API_KEY_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    _cache.ttl = float(config.get("API_KEY_CACHE_TTL", DEFAULT_CACHE_TTL))
+    _revocation_path = config.get("API_KEY_REVOCATION_PATH", DEFAULT_REVOCATION_PATH)
+    _revocations_seen = _revocations_mtime()
+
+
+def hash_key(key: str) -> str:
+    """The hash stored for a key, in hexadecimal."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def issue(user_id: int, level: PermLevel = PermLevel.READ) -> str:
+    """Create an API key for a user, and commit. Returns the key, which is not stored
+    and can't be found again.
+    """
+
+    key = secrets.token_urlsafe(32)
+    db.session.add(APIKey(key_hash=hash_key(key), level=level.value, user_id=user_id))
+    db.session.commit()
+    return key
+
+
+def revoke(key_id: int) -> bool:
+    """Revoke an API key, and commit. Returns False if there is no such key."""
+    api_key = APIKey.query.get(key_id)
+    if api_key is None:
+        return False
+
+    api_key.level = PermLevel.REVOKED.value
+    db.session.commit()
+    return True
+
+
+def _revocations_mtime() -> int:
+    try:
+        return os.stat(_revocation_path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _notify_revocation():
+    try:
+        with open(_revocation_path, "a"):
+            pass
+        os.utime(_revocation_path)
+    except OSError:
+        # Other processes then see the change when their cached credentials expire.
+        pass
+
+
+def _check_revocations():
+    """Clear the cache if other processes changed keys since the last check."""
+    global _revocations_seen
+
+    mtime = _revocations_mtime()
+    if mtime != _revocations_seen:
+        with _revocations_lock:
+            _revocations_seen = mtime
+            _cache.clear()
+
+
+def _load(key_hash: str) -> Optional[Credentials]:
+    row = (
+        db.session.query(APIKey.id, APIKey.user_id, APIKey.level)
+        .filter(APIKey.key_hash == key_hash)
+        .first()
+    )
+    if row is None:
+        return None
+
+    key_id, user_id, level = row
+    return Credentials(key_id, user_id, PermLevel(level))
+
+
+def verify(key: str) -> Optional[Credentials]:
+    """The credentials of an API key, revoked or not, or None if it doesn't exist.
+    Unknown keys are not cached, so that keys issued by other processes are accepted
+    right away.
+    """
+
+    _check_revocations()
+    key_hash = hash_key(key)
+    credentials = _cache.get_or_load(key_hash, lambda: _load(key_hash))
+    if credentials is None:
+        _cache.pop(key_hash)
+
+    return credentials
+
+
+def request_key() -> Optional[str]:
+    """The API key sent with the current request, if any."""
+    scheme, _, key = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not key.strip():
+        return None
+    return key.strip()
+
+
+def load_credentials():
+    """Verify the API key sent with the current request, if any, into
+    `g.credentials`, unless done already. Aborts with a 401 error if the key is unknown
+    or revoked. Requests without a key are let through, with `g.credentials` set to
+    None.
+    """
+
+    if "credentials" in g:
+        return
+
+    g.credentials = None
+    key = request_key()
+    if key is None:
+        return
+
+    credentials = verify(key)
+    if credentials is None or credentials.level == PermLevel.REVOKED:
+        abort(401, message="Invalid or revoked API key.")
+    g.credentials = credentials
+
+
+def key_required(level: PermLevel = PermLevel.READ):
+    """Decorator rejecting requests without an API key of at least `level`."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            load_credentials()
+            if g.credentials is None:
+                abort(401, message="An API key is required.")
+            if g.credentials.level < level:
+                abort(403, message="This API key doesn't allow this action.")
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Changes to existing keys are applied once committed, so that a concurrent
+#  verification cannot cache credentials as they were before the commit.
+@event.listens_for(APIKey, "after_update")
+@event.listens_for(APIKey, "after_delete")
+def _track_change(_mapper, _connection, api_key):
+    session = object_session(api_key)
+    if session is not None:
+        session.info.setdefault("api_keys_changed", set()).add(api_key.key_hash)
+    else:
+        _cache.pop(api_key.key_hash)
+        _notify_revocation()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    changed = session.info.pop("api_keys_changed", ())
+    for key_hash in changed:
+        _cache.pop(key_hash)
+    if changed:
+        _notify_revocation()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("api_keys_changed", None)
+
+
+@api_keys.cli.command("issue")
+@click.argument("user_id", type=int)
+@click.option(
+    "--level",
+    type=click.Choice([level.name for level in PermLevel if level.value > 0]),
+    default=PermLevel.READ.name,
+    show_default=True,
+)
+def issue_command(user_id: int, level: str):
+    """Issue an API key for a user, and print it."""
+    click.echo(issue(user_id, PermLevel[level]))
+
+
+@api_keys.cli.command("revoke")
+@click.argument("key_id", type=int)
+def revoke_command(key_id: int):
+    """Revoke an API key by ID."""
+    if not revoke(key_id):
+        raise click.ClickException(f"No API key with ID {key_id}.")
+    click.echo(f"Revoked API key {key_id}.")
@@ -0,0 +1,546 @@
+"""In-memory prefix indexes, to complete what users type without querying the database.
+
+The index of lemma contents is built from the `lemma` table on first use, then kept up
+to date as lemmas are committed in this process; changes made by other processes are
+picked up when the index is rebuilt, every `LEMMA_AUTOCOMPLETE_TTL` seconds.
+
+The catalog index of resource names and tags is built from the `resource_name` and
+`tag` tables when the app serves its first request, then kept up to date in the same
+way, and rebuilt every `AUTOCOMPLETE_TTL` seconds. Names and tags are completed from
+their own words, and from their pinyin, whole or as initials, so that "hy", "hanyu"
+and "汉" all complete "汉语".
+
+Indexes are rebuilt in a background thread, while requests are still answered from
+the previous index, which is then swapped for the new one.
+"""
+
+import threading
+import time
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+import jieba
+from flask import Flask, current_app, has_app_context
+from pypinyin import Style, lazy_pinyin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Lemma, Resource, ResourceName, Tag, tags_helper
+
+
+V = TypeVar("V", bound=Hashable)
+I = TypeVar("I")
+
+DEFAULT_LEMMA_TTL = 600.0
+"""Seconds after which the lemma index is rebuilt from the database."""
+DEFAULT_CATALOG_TTL = 600.0
+"""Seconds after which the index of resource names and tags is rebuilt."""
+CANDIDATES_PER_RESULT = 8
+"""Completions read from the prefix tree per result returned, to be ranked."""
+
+
+class _Node:
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.values: Set = set()
+
+
+class PrefixTrie(Generic[V]):
+    """Thread-safe mapping of strings to sets of values, which lists the strings
+    starting with a given prefix.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of distinct strings in the trie."""
+        return self._size
+
+    def add(self, key: str, value: V):
+        with self._lock:
+            node = self._root
+            for char in key:
+                node = node.children.setdefault(char, _Node())
+
+            if not node.values:
+                self._size += 1
+            node.values.add(value)
+
+    def discard(self, key: str, value: V):
+        with self._lock:
+            path = [self._root]
+            for char in key:
+                node = path[-1].children.get(char)
+                if node is None:
+                    return
+                path.append(node)
+
+            node = path[-1]
+            if value not in node.values:
+                return
+            node.values.discard(value)
+            if not node.values:
+                self._size -= 1
+
+            # Prune the branch if nothing is left below it.
+            for char, parent in zip(reversed(key), reversed(path[:-1])):
+                child = parent.children[char]
+                if child.values or child.children:
+                    break
+                del parent.children[char]
+
+    def complete(
+        self, prefix: str, limit: int = 10
+    ) -> List[Tuple[str, FrozenSet[V]]]:
+        """Up to `limit` `(string, values)` pairs for the strings starting with
+        `prefix`, shortest first and then in code point order.
+        """
+
+        with self._lock:
+            node = self._root
+            for char in prefix:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+
+            # Strings are visited by length, so only the first `limit` are read.
+            results = []
+            level = [(prefix, node)]
+            while level and len(results) < limit:
+                next_level = []
+                for key, node in sorted(level, key=lambda item: item[0]):
+                    if node.values:
+                        results.append((key, frozenset(node.values)))
+                        if len(results) == limit:
+                            break
+                    next_level.extend(
+                        (key + char, child) for char, child in node.children.items()
+                    )
+                level = next_level
+
+            return results
+
+
+class RefreshedIndex(Generic[I]):
+    """An index built from the database by `build`, and rebuilt in the background once
+    `ttl` seconds old or invalidated, while the previous one is still served. Changes
+    applied to the index while it is rebuilt are applied to the new one too.
+    """
+
+    def __init__(self, name: str, build: Callable[[], I], ttl: float):
+        self.name = name
+        self.build = build
+        self.ttl = ttl
+
+        self._index: Optional[I] = None
+        self._built_at = 0.0
+        self._stale = False
+        self._pending: Optional[List[Callable[[I], None]]] = None
+        """Changes applied during a rebuild, or None if no rebuild is running."""
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def get(self) -> I:
+        """The index, building it if there is none yet."""
+        with self._lock:
+            index = self._index
+            expired = self._stale or time.monotonic() - self._built_at > self.ttl
+        if index is not None:
+            if expired:
+                self.refresh()
+            return index
+
+        # Nothing to serve meanwhile: the first caller builds it, or waits for the
+        #  build running in the background, and the others wait.
+        with self._build_lock:
+            if self._index is None:
+                self._rebuild()
+        return self._index
+
+    def refresh(self):
+        """Rebuild the index in a background thread, unless it is already rebuilding.
+        Outside of an app context, the index is marked to be rebuilt on next use.
+        """
+
+        with self._lock:
+            self._stale = True
+            if self._pending is not None or not has_app_context():
+                return
+            self._pending = []
+
+        app = current_app._get_current_object()
+
+        def rebuild():
+            with app.app_context(), self._build_lock:
+                try:
+                    # Unless built meanwhile by a caller which had nothing to serve.
+                    if self._index is None or self._stale:
+                        self._rebuild()
+                except Exception:
+                    app.logger.exception(f"Could not rebuild the {self.name} index.")
+                finally:
+                    db.session.remove()
+
+        threading.Thread(target=rebuild, name=f"{self.name}-index", daemon=True).start()
+
+    def _rebuild(self):
+        with self._lock:
+            if self._pending is None:
+                self._pending = []
+            self._stale = False
+
+        try:
+            index = self.build()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+                self._stale = True
+            raise
+
+        with self._lock:
+            for change in self._pending:
+                change(index)
+            self._pending = None
+            self._index = index
+            self._built_at = time.monotonic()
+
+    def apply(self, change: Callable[[I], None]):
+        """Apply a change to the index, if built, and to the one being rebuilt."""
+        with self._lock:
+            index = self._index
+            if self._pending is not None:
+                self._pending.append(change)
+        if index is not None:
+            change(index)
+
+
+def configure(config):
+    """Apply the app's settings: `LEMMA_AUTOCOMPLETE_TTL` and `AUTOCOMPLETE_TTL`."""
+    _lemmas.ttl = float(config.get("LEMMA_AUTOCOMPLETE_TTL", DEFAULT_LEMMA_TTL))
+    _catalog.ttl = float(config.get("AUTOCOMPLETE_TTL", DEFAULT_CATALOG_TTL))
+
+
+def _build_lemmas() -> PrefixTrie[int]:
+    trie = PrefixTrie()
+    rows = db.session.query(Lemma.id, Lemma.content).yield_per(10000)
+    for lemma_id, content in rows:
+        trie.add(content, lemma_id)
+
+    return trie
+
+
+_lemmas = RefreshedIndex("lemma", _build_lemmas, DEFAULT_LEMMA_TTL)
+
+
+def lemma_index() -> PrefixTrie[int]:
+    """The index of lemma contents to lemma IDs, building it if needed."""
+    return _lemmas.get()
+
+
+def complete_lemmas(prefix: str, limit: int = 10) -> List[Tuple[str, List[int]]]:
+    """Up to `limit` lemma contents starting with `prefix`, shortest first, each with
+    the IDs of the lemmas having it.
+    """
+
+    return [
+        (content, sorted(ids)) for content, ids in lemma_index().complete(prefix, limit)
+    ]
+
+
+def invalidate_lemmas():
+    """Have the lemma index rebuilt.
+    Call this after changing lemmas without going through the `Lemma` model.
+    """
+
+    _lemmas.refresh()
+
+
+# New lemmas are added to the index once committed, so that it never lists rolled
+#  back ones; other changes are rare, and simply have the index rebuilt.
+@event.listens_for(Lemma, "after_insert")
+def _track_insert(_mapper, _connection, lemma):
+    session = object_session(lemma)
+    if session is not None:
+        inserted = session.info.setdefault("lemmas_inserted", [])
+        inserted.append((lemma.content, lemma.id))
+
+
+@event.listens_for(Lemma, "after_update")
+@event.listens_for(Lemma, "after_delete")
+def _track_change(_mapper, _connection, lemma):
+    session = object_session(lemma)
+    if session is not None:
+        session.info["lemmas_changed"] = True
+    else:
+        invalidate_lemmas()
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(session):
+    inserted = session.info.pop("lemmas_inserted", ())
+    if session.info.pop("lemmas_changed", False):
+        invalidate_lemmas()
+        return
+
+    if inserted:
+
+        def add(trie: PrefixTrie[int]):
+            for content, lemma_id in inserted:
+                trie.add(content, lemma_id)
+
+        _lemmas.apply(add)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("lemmas_inserted", None)
+    session.info.pop("lemmas_changed", None)
+
+
+class Completion(NamedTuple):
+    """A resource name (`kind` "resource", with the resource's ID) or a tag (`kind`
+    "tag", with the tag's ID) to complete what users type with.
+    """
+
+    kind: str
+    id: int
+    value: str
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def completion_keys(value: str) -> Set[str]:
+    """Strings under which a value is completed: the value from each of its words (as
+    segmented by jieba), and its pinyin without spaces, whole and as initials, from
+    each of its words too.
+    """
+
+    text = normalize(value)
+    starts = []
+    position = 0
+    for word in jieba.cut(text, cut_all=False):
+        if word.strip():
+            starts.append(position)
+        position += len(word)
+
+    keys = set()
+    for start in starts:
+        phrase = text[start:]
+        keys.add(phrase)
+        for style in (Style.NORMAL, Style.FIRST_LETTER):
+            keys.add("".join(lazy_pinyin(phrase, style=style)).replace(" ", ""))
+
+    keys.discard("")
+    return keys
+
+
+class CatalogIndex:
+    """Prefix index of completions, ranked by how closely they match and then by
+    weight, higher first.
+    """
+
+    def __init__(self):
+        self.trie: PrefixTrie[Completion] = PrefixTrie()
+        self.weights: Dict[Completion, float] = {}
+
+    def add(self, completion: Completion, weight: float = 0.0):
+        self.weights[completion] = weight
+        for key in completion_keys(completion.value):
+            self.trie.add(key, completion)
+
+    def discard(self, completion: Completion) -> float:
+        """Remove a completion, returning its weight."""
+        for key in completion_keys(completion.value):
+            self.trie.discard(key, completion)
+        return self.weights.pop(completion, 0.0)
+
+    def complete(
+        self, prefix: str, limit: int = 10, kinds: Optional[Iterable[str]] = None
+    ) -> List[Completion]:
+        """Up to `limit` completions of `prefix`, of the given `kinds` if any: those
+        whose shortest matching string is the shortest first, then by weight.
+        """
+
+        prefix = normalize(prefix)
+        kinds = set(kinds) if kinds is not None else None
+        distances: Dict[Completion, int] = {}
+        for query in {prefix, prefix.replace(" ", "")}:
+            for key, completions in self.trie.complete(
+                query, limit * CANDIDATES_PER_RESULT
+            ):
+                for completion in completions:
+                    if kinds is None or completion.kind in kinds:
+                        distance = len(key) - len(query)
+                        distances[completion] = min(
+                            distance, distances.get(completion, distance)
+                        )
+
+        ranked = sorted(
+            distances,
+            key=lambda completion: (
+                distances[completion],
+                -self.weights.get(completion, 0.0),
+                completion.value,
+            ),
+        )
+        return ranked[:limit]
+
+
+def _build_catalog() -> CatalogIndex:
+    index = CatalogIndex()
+
+    # Names are weighted by the rank of their resource, and tags by their share of
+    #  resources relative to the most used one, both between 0 and 1.
+    names = (
+        db.session.query(ResourceName.resource_id, ResourceName.value, Resource.rank)
+        .join(Resource, Resource.id == ResourceName.resource_id)
+        .yield_per(10000)
+    )
+    for resource_id, value, rank in names:
+        index.add(Completion("resource", resource_id, value), rank)
+
+    tags = (
+        db.session.query(Tag.id, Tag.value, db.func.count(tags_helper.c.resource_id))
+        .outerjoin(tags_helper, tags_helper.c.tag_id == Tag.id)
+        .group_by(Tag.id)
+        .all()
+    )
+    most_used = max((count for _, _, count in tags), default=0) or 1
+    for tag_id, value, count in tags:
+        index.add(Completion("tag", tag_id, value), count / most_used)
+
+    return index
+
+
+_catalog = RefreshedIndex("autocomplete", _build_catalog, DEFAULT_CATALOG_TTL)
+
+
+def catalog_index() -> CatalogIndex:
+    """The index of resource names and tags, building it if needed."""
+    return _catalog.get()
+
+
+def complete_catalog(
+    prefix: str, limit: int = 10, kinds: Optional[Iterable[str]] = None
+) -> List[Completion]:
+    """Up to `limit` resource names and tags completing `prefix`, the best first.
+    `kinds` restricts them to "resource" or "tag".
+    """
+
+    return catalog_index().complete(prefix, limit, kinds)
+
+
+def invalidate_catalog():
+    """Have the index of resource names and tags rebuilt.
+    Call this after changing them without going through the models.
+    """
+
+    _catalog.refresh()
+
+
+def warm_up(app: Flask):
+    """Build the index of resource names and tags in the background when the app
+    serves its first request, so that the first lookups don't wait for it. Commands
+    such as `flask db upgrade` don't build it, as the tables may not exist yet.
+    """
+
+    app.before_first_request(_catalog.refresh)
+
+
+def _completion(target) -> Completion:
+    if isinstance(target, Tag):
+        return Completion("tag", target.id, target.value)
+    return Completion("resource", target.resource_id, target.value)
+
+
+def _track_catalog(
+    target, old: Optional[Completion], new: Optional[Completion], stale=False
+):
+    session = object_session(target)
+    if session is None:
+        invalidate_catalog()
+    elif stale:
+        session.info["catalog_stale"] = True
+    else:
+        session.info.setdefault("catalog_changes", []).append((old, new))
+
+
+@event.listens_for(ResourceName, "after_insert")
+@event.listens_for(Tag, "after_insert")
+def _track_catalog_insert(_mapper, _connection, target):
+    _track_catalog(target, None, _completion(target))
+
+
+@event.listens_for(ResourceName, "after_update")
+@event.listens_for(Tag, "after_update")
+def _track_catalog_update(_mapper, _connection, target):
+    state = inspect(target)
+    new = _completion(target)
+    old = {}
+    for name in ("value", "resource_id") if new.kind == "resource" else ("value",):
+        history = state.attrs[name].history
+        if history.deleted:
+            old[name] = history.deleted[0]
+        elif history.added:
+            # Changed without having been loaded: the previous value is unknown.
+            _track_catalog(target, None, None, stale=True)
+            return
+
+    if old:
+        previous = new._replace(
+            id=old.get("resource_id", new.id), value=old.get("value", new.value)
+        )
+        _track_catalog(target, previous, new)
+
+
+@event.listens_for(ResourceName, "after_delete")
+@event.listens_for(Tag, "after_delete")
+def _track_catalog_delete(_mapper, _connection, target):
+    _track_catalog(target, _completion(target), None)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_catalog_committed(session):
+    changes = session.info.pop("catalog_changes", ())
+    if session.info.pop("catalog_stale", False):
+        invalidate_catalog()
+        return
+
+    if changes:
+
+        def update(index: CatalogIndex):
+            for old, new in changes:
+                # Renamed names and tags keep their weight until the next rebuild;
+                #  an index which already has the change keeps the weight it has.
+                weight = index.weights.get(new, 0.0)
+                if old is not None and old in index.weights:
+                    weight = index.discard(old)
+                if new is not None:
+                    index.add(new, weight)
+
+        _catalog.apply(update)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_catalog_rolled_back(session):
+    session.info.pop("catalog_changes", None)
+    session.info.pop("catalog_stale", None)
@@ -0,0 +1,148 @@
+"""In-process caches shared by the rest of the API."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    TypeVar,
+)
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class LRUCache(Generic[K, V]):
+    """Thread-safe mapping holding at most `max_size` entries, evicting the least
+    recently used first. If `ttl` is given, entries also expire after `ttl` seconds.
+    If `max_weight` is given, entries are also evicted while the sum of `weigh(value)`
+    over all entries exceeds it, e.g. to bound the memory taken by values.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+        max_weight: Optional[int] = None,
+        weigh: Callable[[V], int] = lambda value: 1,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[K, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._invalidations = 0
+        """Incremented on every pop and clear, to detect loads racing with them."""
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at, _weight = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                self._remove(key)
+
+            self.misses += 1
+            return default
+
+    def _remove(self, key: K) -> tuple:
+        entry = self._entries.pop(key)
+        self.weight -= entry[2]
+        return entry
+
+    def _set(self, key: K, value: V):
+        if key in self._entries:
+            self._remove(key)
+
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        weight = self.weigh(value)
+        self._entries[key] = (value, expires_at, weight)
+        self.weight += weight
+        while len(self._entries) > self.max_size or (
+            self.max_weight is not None and self.weight > self.max_weight
+        ):
+            self._remove(next(iter(self._entries)))
+
+    def set(self, key: K, value: V):
+        with self._lock:
+            self._set(key, value)
+
+    def get_or_load(self, key: K, load: Callable[[], V]) -> V:
+        """Return the cached value for `key`, calling `load` to fill it if missing.
+        `load` runs outside of the lock, so concurrent misses may load twice; a value
+        loaded while entries were being invalidated is returned but not cached, as it
+        may predate the invalidation.
+        """
+
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            invalidations = self._invalidations
+            value = load()
+            with self._lock:
+                if invalidations == self._invalidations:
+                    self._set(key, value)
+
+        return value
+
+    def get_many_or_load(
+        self, keys: Iterable[K], load: Callable[[List[K]], Mapping[K, V]]
+    ) -> Dict[K, V]:
+        """Return the cached values for `keys`, calling `load` once with all missing
+        keys to fill them in. Keys which `load` doesn't return are left out of the
+        result, and not cached. Values are cached as in `get_or_load`.
+        """
+
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+
+        if missing:
+            invalidations = self._invalidations
+            loaded = load(missing)
+            with self._lock:
+                if invalidations == self._invalidations:
+                    for key, value in loaded.items():
+                        self._set(key, value)
+            found.update(loaded)
+
+        return found
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            entry = self._remove(key) if key in self._entries else _MISSING
+            self._invalidations += 1
+
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+            self._invalidations += 1
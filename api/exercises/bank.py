@@ -0,0 +1,188 @@
+"""Exercise bank: example sentences precomputed for every lemma by a batch job.
+
+Sentences are stored already segmented, so that exercises are selected for a learner
+by reading the sentences of a lemma and scoring their tokens against the learner's
+vocabulary, exactly as live exercises are, without any scraping or segmentation at
+request time.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import AbstractSet, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from exercises.corpus import Sentence, SentenceCorpus
+from exercises.fetch import Fetcher
+from exercises.scoring import coverage, encode, select, tokenize
+from exercises.scrape import scrape_sentences
+from models import db, ExerciseBankStatus, ExerciseSentence, Lemma
+
+
+DEFAULT_SENTENCES_PER_LEMMA = 100
+DEFAULT_WORKERS = 4
+
+
+def bank_exercises(
+    hanzi_phrase: str,
+    known_words: AbstractSet[str],
+    amount: int,
+    difficulty_limit: float,
+) -> List[Tuple[float, str, Optional[str]]]:
+    """Select `(score, hanzi, pinyin)` for the best banked sentences of a phrase,
+    scored as live exercises are. Only sentences scoring at least `difficulty_limit` are
+    kept, unless none does, in which case the best one is. An empty list means the
+    phrase is not in the bank.
+    """
+
+    # Lemmas sharing the phrase as content have the same sentences, read only once.
+    rows = (
+        db.session.query(
+            ExerciseSentence.hanzi, ExerciseSentence.pinyin, ExerciseSentence.tokens
+        )
+        .join(Lemma, Lemma.id == ExerciseSentence.lemma_id)
+        .filter(Lemma.content == hanzi_phrase)
+        .distinct(ExerciseSentence.hanzi)
+        .order_by(ExerciseSentence.hanzi, ExerciseSentence.id)
+        .all()
+    )
+    if not rows:
+        return []
+
+    scores = coverage(encode([tokens for _, _, tokens in rows]), known_words)
+    return [
+        (float(scores[i]), rows[i].hanzi, rows[i].pinyin)
+        for i in select(scores, amount, difficulty_limit)
+    ]
+
+
+def collect_sentences(
+    phrase: str,
+    corpus: Optional[SentenceCorpus],
+    fetcher: Optional[Fetcher],
+    limit: int,
+) -> List[Tuple[Sentence, List[str]]]:
+    """Find and segment up to `limit` sentences for a phrase, shortest first.
+    Raises `ScrapeFailed` if the sites had to be scraped but couldn't be reached.
+    Runs on worker threads: it must not touch the database.
+    """
+
+    sentences = corpus.search(phrase) if corpus is not None else []
+    if not sentences:
+        sentences = scrape_sentences(phrase, fetcher=fetcher, strict=True)
+        if corpus is not None:
+            corpus.add(sentences)
+
+    unique = {sentence.hanzi: sentence for sentence in sentences if sentence.hanzi}
+    chosen = sorted(unique.values(), key=lambda sentence: len(sentence.hanzi))[:limit]
+    return list(zip(chosen, tokenize(chosen)))
+
+
+def store_sentences(
+    lemma_ids: Sequence[int], sentences: List[Tuple[Sentence, List[str]]]
+) -> bool:
+    """Replace the banked sentences of lemmas sharing the same content and mark them as
+    built, in one commit. Without any sentence, the lemmas are left as they were, to be
+    retried by the next build, and False is returned.
+    """
+
+    if not sentences:
+        return False
+
+    now = datetime.now(timezone.utc)
+    ExerciseSentence.query.filter(ExerciseSentence.lemma_id.in_(lemma_ids)).delete(
+        synchronize_session=False
+    )
+    db.session.bulk_insert_mappings(
+        ExerciseSentence,
+        [
+            {
+                "lemma_id": lemma_id,
+                "hanzi": sentence.hanzi,
+                "translation": sentence.translation,
+                "pinyin": sentence.pinyin,
+                "tokens": tokens,
+            }
+            for lemma_id in lemma_ids
+            for sentence, tokens in sentences
+        ],
+    )
+    for lemma_id in lemma_ids:
+        db.session.merge(ExerciseBankStatus(lemma_id=lemma_id, built_date=now))
+    db.session.commit()
+    return True
+
+
+def lemmas_to_build(full: bool = False) -> List[Tuple[str, List[int]]]:
+    """`(content, ids)` of the lemmas never built or modified since their last build,
+    or of all lemmas if `full`, grouped by content: lemmas sharing a content have the
+    same sentences, which are collected once for all of them.
+    """
+
+    query = db.session.query(
+        Lemma.content, func.array_agg(aggregate_order_by(Lemma.id, Lemma.id))
+    ).outerjoin(ExerciseBankStatus, ExerciseBankStatus.lemma_id == Lemma.id)
+    if not full:
+        query = query.filter(
+            or_(
+                ExerciseBankStatus.lemma_id.is_(None),
+                Lemma.modified_date > ExerciseBankStatus.built_date,
+            )
+        )
+
+    return query.group_by(Lemma.content).order_by(func.min(Lemma.id)).all()
+
+
+def build_bank(
+    corpus: Optional[SentenceCorpus],
+    fetcher: Optional[Fetcher],
+    full: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    sentences_per_lemma: int = DEFAULT_SENTENCES_PER_LEMMA,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """Build the bank for the lemmas that need it, returning how many were built.
+    Sentences are collected once per content on `workers` threads, at most `workers`
+    contents at a time beyond those running; the lemmas of each content are committed
+    on their own, so an interrupted run resumes where it stopped, and lemmas which
+    failed, e.g. because the sites couldn't be reached, or for which no sentence was
+    found are retried by the next run. `progress(built, total)` is called after each
+    content.
+    """
+
+    lemmas = lemmas_to_build(full)
+    total = sum(len(lemma_ids) for _, lemma_ids in lemmas)
+    done = 0
+    pending = {}
+    remaining = iter(lemmas)
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="exercise-bank") as executor:
+
+        def schedule():
+            for content, lemma_ids in remaining:
+                future = executor.submit(
+                    collect_sentences, content, corpus, fetcher, sentences_per_lemma
+                )
+                pending[future] = lemma_ids
+                if len(pending) >= 2 * workers:
+                    break
+
+        schedule()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                lemma_ids = pending.pop(future)
+                try:
+                    if store_sentences(lemma_ids, future.result()):
+                        done += len(lemma_ids)
+                except Exception:
+                    # The lemmas are left unmarked, so that the next run retries them.
+                    db.session.rollback()
+
+                if progress is not None:
+                    progress(done, total)
+
+            schedule()
+
+    return done
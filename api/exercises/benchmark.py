@@ -0,0 +1,321 @@
+"""Offline benchmark of the exercise pipeline.
+
+Pages recorded from jukuu and Purple Culture (in `exercises/fixtures`) are served by a
+local stand-in for both sites, so that each stage of exercise generation can be timed
+without network access, and the results compared between commits. From `api/`:
+
+    python -m exercises.benchmark --output after.json --compare before.json
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+
+import click
+import jieba
+import requests
+from requests.adapters import BaseAdapter
+
+from exercises.blanking import Blanker, blanker_for
+from exercises.corpus import Sentence
+from exercises.fetch import Fetcher
+from exercises.scoring import coverage, encode, select, tokenize
+from exercises.scrape import (
+    JUKUU_PAGES,
+    _parse,
+    jukuu_url,
+    parse_jukuu,
+    parse_purple,
+    parse_purple_page_count,
+    purple_url,
+    scrape_sentences,
+)
+
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SAMPLE_VOCABULARY_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "sample_vocabulary.txt"
+)
+DEFAULT_REPEAT = 20
+DEFAULT_VOCABULARY_SIZES = (100, 1000)
+"""Sizes of the vocabularies scored against, besides the whole sample vocabulary."""
+EXERCISE_AMOUNT = 5
+DIFFICULTY_LIMIT = 0.7
+
+
+class FixtureAdapter(BaseAdapter):
+    """Answers requests with recorded pages instead of going to the network, after
+    `latency` seconds; URLs without a recording get a 404.
+    """
+
+    def __init__(self, pages: Mapping[str, bytes], latency: float = 0.0):
+        super().__init__()
+        self.pages = pages
+        self.latency = latency
+
+    def send(self, request, **kwargs) -> requests.Response:
+        if self.latency:
+            time.sleep(self.latency)
+
+        content = self.pages.get(request.url)
+        response = requests.Response()
+        response.status_code = 200 if content is not None else 404
+        response._content = content or b""
+        response.headers["Content-Type"] = "text/html; charset=utf-8"
+        response.url = request.url
+        response.request = request
+        response.reason = "OK" if content is not None else "Not Found"
+        return response
+
+    def close(self):
+        pass
+
+
+def prepared_url(url: str) -> str:
+    """The URL as requests sends it, with the phrase percent-encoded."""
+    return requests.Request("GET", url).prepare().url
+
+
+def load_fixtures(path: str = FIXTURES_PATH) -> Dict[str, Dict[str, bytes]]:
+    """Map each recorded phrase to the bodies of its jukuu and Purple Culture pages."""
+    with open(os.path.join(path, "index.json"), encoding="utf-8") as file:
+        index = json.load(file)
+
+    fixtures = {}
+    for phrase, files in index.items():
+        fixtures[phrase] = {}
+        for site, name in files.items():
+            with open(os.path.join(path, name), "rb") as file:
+                fixtures[phrase][site] = file.read()
+
+    return fixtures
+
+
+def page_urls(phrase: str, pages: Mapping[str, bytes]) -> Dict[str, str]:
+    """Map the URLs scraped for a phrase to the site each belongs to. Every page of a
+    site is served from the same recording.
+    """
+
+    urls = {jukuu_url(phrase, page): "jukuu" for page in range(JUKUU_PAGES)}
+    for page in range(1, parse_purple_page_count(pages["purple"]) + 1):
+        urls[purple_url(phrase, page)] = "purple"
+
+    return urls
+
+
+def offline_fetcher(
+    fixtures: Mapping[str, Mapping[str, bytes]], latency: float = 0.0
+) -> Fetcher:
+    """A fetcher without page cache whose requests to both sites are served from the
+    fixtures.
+    """
+
+    pages = {
+        prepared_url(url): site_pages[site]
+        for phrase, site_pages in fixtures.items()
+        for url, site in page_urls(phrase, site_pages).items()
+    }
+
+    fetcher = Fetcher(cache=None)
+    adapter = FixtureAdapter(pages, latency)
+    fetcher.mount("http://jukuu.com/", adapter)
+    fetcher.mount("https://www.purpleculture.net/", adapter)
+    return fetcher
+
+
+def sample_words() -> List[str]:
+    with open(SAMPLE_VOCABULARY_PATH, encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def measure(run: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Median and minimum time of `repeat` calls to `run`, in milliseconds, after one
+    call to warm it up.
+    """
+
+    run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "min_ms": min(times) * 1000,
+    }
+
+
+def benchmark_phrase(
+    phrase: str,
+    pages: Mapping[str, bytes],
+    fetcher: Fetcher,
+    vocabularies: Mapping[str, frozenset],
+    repeat: int,
+) -> dict:
+    """Time each stage of exercise generation for one phrase."""
+    urls = page_urls(phrase, pages)
+    parsers = {"jukuu": parse_jukuu, "purple": parse_purple}
+    bodies = fetcher.fetch_many(urls)
+
+    def parse() -> List[Sentence]:
+        return [
+            sentence
+            for (url, site), body in zip(urls.items(), bodies)
+            for sentence in _parse(parsers[site], body)
+        ]
+
+    sentences = parse()
+    tokenized = tokenize(sentences)
+    hanzi = [sentence.hanzi for sentence in sentences]
+
+    stages = {
+        "fetch": measure(lambda: fetcher.fetch_many(urls), repeat),
+        "parse": measure(parse, repeat),
+        "segment": measure(lambda: tokenize(sentences), repeat),
+    }
+    for name, words in vocabularies.items():
+        stages[f"score/{name}"] = measure(
+            lambda: select(
+                coverage(encode(tokenized), words), EXERCISE_AMOUNT, DIFFICULTY_LIMIT
+            ),
+            repeat,
+        )
+
+    # The blanker is built on every run, as it would be for a phrase not seen before.
+    stages["blank"] = measure(
+        lambda: blanker_for.__wrapped__(phrase).blank_all(hanzi), repeat
+    )
+    stages["scrape"] = measure(lambda: scrape_sentences(phrase, fetcher), repeat)
+
+    return {
+        "length": len(phrase),
+        "pages": len(urls),
+        "sentences": len(sentences),
+        "stages": stages,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    repeat: int = DEFAULT_REPEAT,
+    latency: float = 0.0,
+    vocabulary_sizes: Sequence[int] = DEFAULT_VOCABULARY_SIZES,
+    phrases: Optional[Sequence[str]] = None,
+) -> dict:
+    """Benchmark every recorded phrase (or only `phrases`), returning the results as a
+    JSON-serialisable dict.
+    """
+
+    fixtures = load_fixtures()
+    fetcher = offline_fetcher(fixtures, latency)
+
+    words = sample_words()
+    vocabularies = {str(size): frozenset(words[:size]) for size in vocabulary_sizes}
+    vocabularies["all"] = frozenset(words)
+
+    jieba.setLogLevel(60)
+    jieba.initialize()
+    Blanker(["warm-up"])
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "latency_ms": latency * 1000,
+        "vocabulary_sizes": {name: len(words) for name, words in vocabularies.items()},
+        "results": {
+            phrase: benchmark_phrase(
+                phrase, fixtures[phrase], fetcher, vocabularies, repeat
+            )
+            for phrase in (phrases or fixtures)
+        },
+    }
+
+
+def print_results(results: dict):
+    for phrase, result in results["results"].items():
+        click.echo(
+            f"{phrase} ({result['length']} characters, {result['pages']} pages, "
+            f"{result['sentences']} sentences)"
+        )
+        for stage, timing in result["stages"].items():
+            click.echo(
+                f"  {stage:<12} {timing['median_ms']:9.3f} ms "
+                f"(min {timing['min_ms']:.3f})"
+            )
+
+
+def print_comparison(old: dict, new: dict):
+    """Print the ratio of new to old median times, for stages present in both."""
+    click.echo(f"{old.get('commit') or '?'} -> {new.get('commit') or '?'}")
+    for phrase, result in new["results"].items():
+        old_stages = old["results"].get(phrase, {}).get("stages", {})
+        click.echo(phrase)
+        for stage, timing in result["stages"].items():
+            if stage not in old_stages:
+                continue
+
+            before = old_stages[stage]["median_ms"]
+            after = timing["median_ms"]
+            ratio = after / before if before else float("inf")
+            click.echo(
+                f"  {stage:<12} {before:9.3f} -> {after:9.3f} ms  x{ratio:.2f}"
+            )
+
+
+@click.command()
+@click.option("--repeat", default=DEFAULT_REPEAT, show_default=True)
+@click.option(
+    "--latency",
+    default=0.0,
+    show_default=True,
+    help="Simulated response time of the sites, in milliseconds.",
+)
+@click.option(
+    "--vocabulary-size",
+    "vocabulary_sizes",
+    multiple=True,
+    type=int,
+    help="Known vocabulary sizes to score against, besides the whole sample one.",
+)
+@click.option("--phrase", "phrases", multiple=True, help="Only benchmark these.")
+@click.option("--output", type=click.File("w", encoding="utf-8"))
+@click.option(
+    "--compare",
+    type=click.File("r", encoding="utf-8"),
+    help="Results of a previous run to compare against.",
+)
+def main(repeat, latency, vocabulary_sizes, phrases, output, compare):
+    results = run_benchmark(
+        repeat=repeat,
+        latency=latency / 1000,
+        vocabulary_sizes=vocabulary_sizes or DEFAULT_VOCABULARY_SIZES,
+        phrases=phrases,
+    )
+
+    print_results(results)
+    if output is not None:
+        json.dump(results, output, ensure_ascii=False, indent=2)
+    if compare is not None:
+        print_comparison(json.load(compare), results)
+
+
+if __name__ == "__main__":
+    main()
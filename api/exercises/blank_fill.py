@@ -1,10 +1,29 @@
-from flask import Blueprint, request
-from flask_restful import Resource, Api
-import math
-import jieba
-import requests
-from bs4 import BeautifulSoup
+from flask import Blueprint, Response, g, request, current_app, stream_with_context
+from flask_restful import Resource, Api, abort
+from itertools import chain
+from typing import AbstractSet, Iterator, List, Optional, Sequence, Tuple
+import json
+import click
+import numpy as np
+from exercises.blanking import blanker_for
+from exercises.bank import DEFAULT_SENTENCES_PER_LEMMA, bank_exercises, build_bank
+from exercises.corpus import (
+    DEFAULT_CORPUS_PATH,
+    SentenceCorpus,
+    get_corpus,
+    read_triples,
+)
+from exercises.fetch import Fetcher, get_fetcher
+from exercises.jobs import QueueFull, get_job_queue, serialize_job
+from exercises.page_cache import get_page_cache
+from exercises.scoring import score, score_sentences, select
+from auth import load_credentials
+from exercises.scrape import iter_scraped_pages, scrape_sentences
+from vocabulary import known_vocabulary, sample_vocabulary
+
 
+MAX_AMOUNT = 100
+"""Maximum exercises sent for one request."""
 
 blank_exercises = Blueprint(
     "fill_in_the_blank",
@@ -12,6 +31,7 @@ blank_exercises = Blueprint(
     static_folder=".../build",
     static_url_path="/",
     url_prefix="/api/",
+    cli_group="exercises",
 )
 
 api = Api(blank_exercises)
@@ -25,213 +45,353 @@ class FillInTheBlank(Resource):
     # or work out some sort of deal with PurpleCulture to not have our IP address banned if that issue ever arises.
 
     def get(self):
-        """Example usage: http://localhost:5000/api/fillin?hanzi=%E5%96%9C%E6%AC%A2&amount=5&limit=0.7 (~20 sec to load)"""
-        args = request.args
-        phrase = args["hanzi"]
-        amount = int(args["amount"])
-        difficulty_limit = float(args["limit"])
+        """Example usage: http://localhost:5000/api/fillin?hanzi=%E5%96%9C%E6%AC%A2&amount=5&limit=0.7 (seconds to load if not in corpus)"""
+        phrase, amount, difficulty_limit = parse_exercise_args(request.args)
+        user_id = request_user_id()
 
-        exercises = generate_exercises(phrase, amount, difficulty_limit)
+        return {"exercises": run_exercises(phrase, amount, difficulty_limit, user_id)}
 
-        return {"exercises": exercises}
 
+class FillInTheBlankStream(Resource):
+    """Streams fill in the blank exercises as soon as each one is found.
+    Exercises are sent as Server-Sent Events if the client accepts
+    `text/event-stream`, and as newline-delimited JSON otherwise.
+    """
+
+    def get(self):
+        phrase, amount, difficulty_limit = parse_exercise_args(request.args)
+        options = pipeline_options(request_user_id())
+        exercises = banked_exercises(
+            phrase, amount, difficulty_limit, options["known_vocab"]
+        ) or stream_exercises(phrase, amount, difficulty_limit, **options)
+
+        accepted = request.accept_mimetypes.best_match(
+            ["application/x-ndjson", "text/event-stream"]
+        )
+        if accepted == "text/event-stream":
+            mimetype = "text/event-stream"
+            body = (
+                f"event: exercise\ndata: {json.dumps(exercise, ensure_ascii=False)}\n\n"
+                for exercise in exercises
+            )
+            body = chain(body, ["event: end\ndata: {}\n\n"])
+        else:
+            mimetype = "application/x-ndjson"
+            body = (
+                json.dumps(exercise, ensure_ascii=False) + "\n"
+                for exercise in exercises
+            )
 
-def generate_exercises(hanzi_phrase: str, amount=5, difficulty_limit=0.7):
-    """Generates fill in the blank exercises."""
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            # Proxies must not hold exercises back until the response is complete.
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
-    # NOTE: currently using an example document with known user text. This would be changed
-    # to instead access the user's known vocabulary in the database, and this code would
-    # have to be updated to match this in that case. We should add a username argument
-    # to the get request above and have the database search that user's vocabulary in this
-    # function.
 
-    # IMPORTANT: takes a while to load, because scraping and accessing the web pages isn't fast.
-    # We should probably introduce a loading bar or have this run in the background for users.
+class FillInTheBlankJobs(Resource):
+    """Queues fill in the blank exercises to be generated in the background."""
 
-    try:
-        file = open("exercises/sample_vocabulary.txt", "r")
+    def post(self):
+        """Takes the same parameters as FillInTheBlank, as JSON or in the query string.
+        Returns the job right away; poll its URL (in the Location header) for results.
+        """
 
-    except FileNotFoundError:
-        file = open("sample_vocabulary.txt", "r")
+        args = request.get_json(silent=True) or request.args
+        phrase, amount, difficulty_limit = parse_exercise_args(args)
 
-    words = file.readlines()
+        queue = get_job_queue(run_exercises, current_app.config)
+        try:
+            job = queue.submit(
+                current_app._get_current_object(),
+                phrase,
+                amount,
+                difficulty_limit,
+                request_user_id(),
+            )
+        except QueueFull:
+            job = None
 
-    known_vocab = set()
+        if job is None:
+            abort(503, message="Too many exercises are being generated, retry later.")
 
-    for i in range(len(words)):
-        known_vocab.add(words[i][: len(words[i]) - 1])
+        location = api.url_for(FillInTheBlankJob, job_id=job.id)
+        return serialize_job(job), 202, {"Location": location}
 
-    # add some punctuation as well
 
-    known_vocab.add("。")
-    known_vocab.add("，")
-    known_vocab.add("：")
-    known_vocab.add("；")
-    known_vocab.add("-")
-    known_vocab.add("？")
-    known_vocab.add("！")
-    known_vocab.add(" ")
-    known_vocab.add("_")
-    known_vocab.add("'")
-    known_vocab.add('"')
+class FillInTheBlankJob(Resource):
+    """Reports on the status of a fill in the blank job, with its results when done."""
 
-    file.close()
+    def get(self, job_id: int):
+        job = get_job_queue(run_exercises, current_app.config).find(job_id)
+        # Results scored against a user's vocabulary are only shown to that user.
+        if job is None or job.user_id not in (None, request_user_id()):
+            abort(404, message="No such job, or its results have expired.")
 
-    # Purple Culture supports different ways of looking up sentences - you can either look up
-    # sentences that *contain* n words, or you can find sentences that have n words - in a row.
+        return serialize_job(job)
 
-    purple_phrase = ""
-    for i in range(len(hanzi_phrase)):
-        if i != len(hanzi_phrase) - 1:
-            purple_phrase += hanzi_phrase[i] + "+"
-        else:
-            purple_phrase += hanzi_phrase[i]
 
-    # jukuu is quite slow, but it has simpler sentences more suited to beginners
-    output = []
-    for x in range(10):
-        try:
-            # searching jukuu for sentences
-            response = requests.get(
-                f"http://jukuu.com/show-{hanzi_phrase}-{x}.html", timeout=25
-            )
-            soup = BeautifulSoup(response.content, "html.parser")
-
-            data = soup.find_all("tr")
-            linked_output = []
-
-            # jukuu supports the english meaning and 汉字
-            for tr in data:
-                if tr.has_attr("class"):
-                    if list(tr["class"])[0] == "e" or list(tr["class"])[0] == "c":
-                        try:
-                            linked_output.append(list(tr.children)[1].text.strip())
-                        except:
-                            linked_output = [list(tr.children)[1].text.strip()]
-
-                if len(linked_output) == 2:
-                    output.append(linked_output)
-                    linked_output = []
-
-        except:
-            pass
-
-    # create soup and get number of results
-    response = requests.get(
-        f"https://www.purpleculture.net/sample-sentences/?word={purple_phrase}&page={1}"
+def parse_exercise_args(args) -> Tuple[str, int, float]:
+    """Read `hanzi`, `amount` and `limit` from request arguments."""
+    try:
+        phrase = str(args["hanzi"]).strip()
+        amount = int(args.get("amount", 5))
+        difficulty_limit = float(args.get("limit", 0.7))
+    except KeyError:
+        abort(400, message="Missing parameter: hanzi")
+    except (TypeError, ValueError):
+        abort(400, message="Parameters amount and limit must be numbers.")
+
+    if not phrase:
+        abort(400, message="Missing parameter: hanzi")
+    if not 1 <= amount <= MAX_AMOUNT:
+        abort(400, message=f"Parameter amount must be between 1 and {MAX_AMOUNT}.")
+
+    return phrase, amount, difficulty_limit
+
+
+def request_user_id() -> Optional[int]:
+    """The user whose vocabulary exercises are scored against: the owner of the API
+    key sent with the current request, if any.
+    """
+
+    load_credentials()
+    return g.credentials.user_id if g.credentials is not None else None
+
+
+def run_exercises(
+    hanzi_phrase: str,
+    amount: int,
+    difficulty_limit: float,
+    user_id: Optional[int] = None,
+):
+    """Generate exercises with the corpus and fetcher configured for the current app,
+    scored against the vocabulary of the given user, if any.
+    """
+
+    options = pipeline_options(user_id)
+    banked = banked_exercises(
+        hanzi_phrase, amount, difficulty_limit, options["known_vocab"]
     )
-    soup = BeautifulSoup(response.content, "html.parser")
-    num_results = math.ceil(
-        int(
-            list(soup.findAll("div", {"class": "card-header"})[0].children)[
-                1
-            ].text.split()[5]
-        )
-        / 20
+    if banked:
+        return {"exercises": banked}
+
+    return generate_exercises(hanzi_phrase, amount, difficulty_limit, **options)
+
+
+def banked_exercises(
+    hanzi_phrase: str,
+    amount: int,
+    difficulty_limit: float,
+    known_vocab: AbstractSet[str],
+) -> list:
+    """Exercises from the precomputed bank, or none if the phrase isn't in it."""
+    return make_exercises(
+        hanzi_phrase,
+        bank_exercises(hanzi_phrase, known_vocab, amount, difficulty_limit),
     )
 
-    # limit maximum results searched, otherwise could take forever for simpler exercises
-    if num_results > 30:
-        num_results = 30
-
-    answer = []
 
-    for i in range(num_results):
-        response = requests.get(
-            f"https://www.purpleculture.net/sample-sentences/?word={purple_phrase}&page={i}"
+def pipeline_options(user_id: Optional[int] = None) -> dict:
+    """Corpus, fetcher and known vocabulary to generate exercises with, as configured
+    for the current app.
+    """
+
+    return {
+        "corpus": get_corpus(
+            current_app.config.get("EXERCISES_CORPUS_PATH", DEFAULT_CORPUS_PATH)
+        ),
+        "fetcher": get_fetcher(current_app.config),
+        "known_vocab": (
+            known_vocabulary(user_id).words
+            if user_id is not None
+            else sample_vocabulary().words
+        ),
+    }
+
+
+def generate_exercises(
+    hanzi_phrase: str,
+    amount=5,
+    difficulty_limit=0.7,
+    corpus: Optional[SentenceCorpus] = None,
+    fetcher: Optional[Fetcher] = None,
+    known_vocab: Optional[AbstractSet[str]] = None,
+):
+    """Generates fill in the blank exercises, scored against `known_vocab` (by default
+    an example vocabulary).
+    Sentences are looked up in the local corpus first; the web is only scraped when
+    the corpus has no sentence containing the phrase, and the scraped sentences are
+    then added to the corpus for the next time.
+    """
+
+    # IMPORTANT: takes a while to load when the phrase is not in the corpus, because
+    # scraping and accessing the web pages isn't fast, even when done in parallel.
+    # Clients which can wait should use the job endpoints, which run this in the
+    #  background.
+
+    if known_vocab is None:
+        known_vocab = sample_vocabulary().words
+
+    sentences = corpus.search(hanzi_phrase) if corpus is not None else []
+    if not sentences:
+        sentences = scrape_sentences(hanzi_phrase, fetcher=fetcher)
+        if corpus is not None:
+            corpus.add(sentences)
+
+    if not sentences:
+        return {"exercises": []}
+
+    # sentences from the corpus and from both sites are scored the same way, by the
+    #  proportion of known jieba tokens, keeping only the best `amount` ones
+    possible_exercises = [
+        (score, sentence.hanzi, sentence.pinyin)
+        for score, sentence in score_sentences(
+            sentences, known_vocab, amount, float(difficulty_limit)
         )
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        answer = soup.find_all("li", {"class": "pb-4"})
-
-    # holds all hanzi and pinyin for
-    true_answer = []
-    for sentence in answer:
-        full_sentences = []
-        full_sentences.append(list(sentence.children)[3].text.strip())
-        pinyin = ""
-        hanzi = ""
-
-        for x in range(len(list(sentence.children)[0]) - 1):
-            pinyin += list(list(list(sentence.children)[0].children)[x].children)[
-                0
-            ].text.strip()
-            hanzi += list(list(list(sentence.children)[0].children)[x].children)[
-                1
-            ].text.strip()
-
-        full_sentences.append(hanzi)
-        full_sentences.append(pinyin)
-
-        true_answer.append(full_sentences)
-
-    # known words in each example sentence
-    words_known = {}
-
-    # known words in purple culture
-    p_words_known = {}
-
-    for i in range(len(output)):
-        words_known[i] = [
-            len(
-                set(known_vocab)
-                & set([ele for ele in jieba.cut(output[i][1], cut_all=False)])
-            )
-            / len([ele for ele in jieba.cut(output[i][1], cut_all=False)]),
-            output[i][1],
-        ]
-
-    result = reversed(sorted(words_known.items(), key=lambda x: x[1][0]))
+    ]
 
-    for i in range(len(true_answer)):
-        p_words_known[i] = [
-            len(set(known_vocab) & set(true_answer[i][1])) / len(true_answer[i][1]),
-            true_answer[i][1],
-            true_answer[i][2],
-        ]
-
-    result2 = reversed(sorted(p_words_known.items(), key=lambda x: x[1][0]))
+    # generate the list that will be returned for the API
+    return {"exercises": make_exercises(hanzi_phrase, possible_exercises)}
+
+
+def stream_exercises(
+    hanzi_phrase: str,
+    amount=5,
+    difficulty_limit=0.7,
+    corpus: Optional[SentenceCorpus] = None,
+    fetcher: Optional[Fetcher] = None,
+    known_vocab: Optional[AbstractSet[str]] = None,
+) -> Iterator[list]:
+    """Generates fill in the blank exercises like `generate_exercises`, but yields each
+    one as soon as its sentence scores at least `difficulty_limit`, page by page.
+    Once `amount` exercises have been yielded no further page is fetched. If no
+    sentence reaches the limit, the best one is yielded at the end.
+    """
+
+    if known_vocab is None:
+        known_vocab = sample_vocabulary().words
+
+    sentences = corpus.search(hanzi_phrase) if corpus is not None else []
+    scraping = not sentences
+    pages = iter_scraped_pages(hanzi_phrase, fetcher) if scraping else [sentences]
+
+    sent = 0
+    best = None
+    scraped = []
+    try:
+        for page in pages:
+            if not page:
+                continue
+            if scraping:
+                scraped += page
+
+            scores = score(page, known_vocab)
+            top = int(np.argmax(scores))
+            if best is None or scores[top] > best[0]:
+                best = (float(scores[top]), page[top])
+
+            for i in select(scores, amount - sent, difficulty_limit, fallback=False):
+                yield make_exercise(
+                    hanzi_phrase, float(scores[i]), page[i].hanzi, page[i].pinyin
+                )
+                sent += 1
+                if sent >= amount:
+                    # Partial results are not added to the corpus, or later lookups
+                    #  would find them and never scrape the remaining pages.
+                    return
+    finally:
+        # Stops fetching pages as soon as enough exercises were sent, or the client
+        #  went away.
+        if scraping:
+            pages.close()
+
+    if scraping and corpus is not None:
+        corpus.add(scraped)
+
+    if not sent and best is not None:
+        yield make_exercise(hanzi_phrase, best[0], best[1].hanzi, best[1].pinyin)
+
+
+def make_exercise(
+    hanzi_phrase: str, score: float, hanzi: str, pinyin: Optional[str]
+) -> list:
+    """Blank the phrase out of a sentence, returning `[score, blanked, pinyin, blanks]`
+    where `blanks` holds the `[start, end]` of each blank in `blanked`.
+    """
+
+    return make_exercises(hanzi_phrase, [(score, hanzi, pinyin)])[0]
+
+
+def make_exercises(
+    hanzi_phrase: str, challenges: Sequence[Tuple[float, str, Optional[str]]]
+) -> List[list]:
+    """Blank the phrase out of a batch of `(score, hanzi, pinyin)` sentences."""
+    blanked = blanker_for(hanzi_phrase).blank_all([hanzi for _, hanzi, _ in challenges])
+
+    # depending on whether it is from jukuu or purpleculture it will/won't have pinyin
+    return [
+        [round(score, 3), text, pinyin, [list(blank) for blank in blanks]]
+        for (score, _, pinyin), (text, blanks) in zip(challenges, blanked)
+    ]
 
-    result2 = [ele for ele in result2]
 
-    result = [ele for ele in result]
+api.add_resource(FillInTheBlank, "fillin")
+api.add_resource(FillInTheBlankStream, "fillin/stream")
+api.add_resource(FillInTheBlankJobs, "fillin/jobs")
+api.add_resource(FillInTheBlankJob, "fillin/jobs/<int:job_id>")
 
-    result += result2
 
-    result = reversed(sorted(result, key=lambda x: x[1][0]))
-    result = [ele for ele in result]
+@blank_exercises.cli.command("build-corpus")
+@click.argument("source", type=click.File("r", encoding="utf-8"))
+def build_corpus(source):
+    """Add the sentences in SOURCE to the local sentence corpus.
+    SOURCE is a tab-separated file of `hanzi, translation, pinyin` lines, where
+    translation and pinyin may be left empty.
+    """
 
-    # gather useful sentences (only save those within difficulty range)
-    possible_exercises = []
-    for i in range(len(result)):
-        if result[i][1][0] >= float(difficulty_limit):
-            possible_exercises.append(result[i][1])
+    corpus = get_corpus(
+        current_app.config.get("EXERCISES_CORPUS_PATH", DEFAULT_CORPUS_PATH)
+    )
+    added = corpus.add(read_triples(source))
+    click.echo(f"Added {added} sentences; the corpus now holds {len(corpus)}.")
 
-    if len(possible_exercises) == 0:
-        possible_exercises.append(result[0][1])
 
-    # generate the list that will be returned for the API
-    return_lst = []
-    for challenge in possible_exercises:
-        blank_hanzi = challenge[1]
-        return_sublst = []
-        for i in range(len(hanzi_phrase)):
-            for x in range(len(hanzi_phrase[i])):
-                replace_with = " _ " * len(hanzi_phrase[i])
-                blank_hanzi = blank_hanzi.replace(hanzi_phrase[i], replace_with)
-
-        # depending on whether it is from jukuu or purpleculture it will/won't have pinyin
-        if len(challenge) >= 3:
-            return_sublst.append(round(challenge[0], 3))
-            return_sublst.append(blank_hanzi)
-            return_sublst.append(challenge[2])
-        else:
-            return_sublst.append(round(challenge[0], 3))
-            return_sublst.append(blank_hanzi)
+@blank_exercises.cli.command("page-cache-stats")
+def page_cache_stats():
+    """Show the hit and miss counters and the size of the scraped page cache."""
+    for name, value in get_page_cache(current_app.config).stats().items():
+        click.echo(f"{name}: {value}")
 
-        return_lst.append(return_sublst)
 
-    return {"exercises": return_lst}
+@blank_exercises.cli.command("build-bank")
+@click.option("--full", is_flag=True, help="Rebuild every lemma, not only new ones.")
+@click.option("--workers", default=4, show_default=True, help="Lemmas built at once.")
+@click.option(
+    "--sentences",
+    default=DEFAULT_SENTENCES_PER_LEMMA,
+    show_default=True,
+    help="Maximum sentences kept per lemma.",
+)
+def build_exercise_bank(full, workers, sentences):
+    """Precompute exercise sentences for lemmas added or modified since the last run.
+    Each lemma is saved as soon as it is built: an interrupted run can be resumed by
+    running the command again.
+    """
 
+    def progress(built, total):
+        click.echo(f"\r{built}/{total} lemmas built", nl=False)
 
-api.add_resource(FillInTheBlank, "fillin")
+    corpus = get_corpus(
+        current_app.config.get("EXERCISES_CORPUS_PATH", DEFAULT_CORPUS_PATH)
+    )
+    built = build_bank(
+        corpus,
+        get_fetcher(current_app.config),
+        full=full,
+        workers=workers,
+        sentences_per_lemma=sentences,
+        progress=progress,
+    )
+    click.echo(f"\nDone: {built} lemmas built.")
@@ -0,0 +1,69 @@
+"""Blanking of the target phrase out of exercise sentences.
+
+The phrase and its words are compiled once into a single regular expression, which
+blanks every occurrence in one pass over each sentence and reports where the blanks
+are, so that clients don't have to look for them.
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
+
+import jieba
+
+
+BLANK = " _ "
+"""What each blanked character is replaced with."""
+
+
+class Blanked(NamedTuple):
+    """A sentence with blanks, and the `(start, end)` of each blank in it."""
+
+    text: str
+    blanks: List[Tuple[int, int]]
+
+
+class Blanker:
+    """Blanks any of `patterns` out of sentences.
+    Where patterns overlap, the leftmost and then longest occurrence is blanked.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        patterns = sorted({p for p in patterns if p}, key=len, reverse=True)
+        self._regex = (
+            re.compile("|".join(map(re.escape, patterns))) if patterns else None
+        )
+
+    def blank(self, sentence: str) -> Blanked:
+        if self._regex is None:
+            return Blanked(sentence, [])
+
+        parts = []
+        blanks = []
+        position = 0
+        length = 0
+        for match in self._regex.finditer(sentence):
+            kept = sentence[position : match.start()]
+            blank = BLANK * (match.end() - match.start())
+
+            parts += (kept, blank)
+            length += len(kept)
+            blanks.append((length, length + len(blank)))
+            length += len(blank)
+            position = match.end()
+
+        parts.append(sentence[position:])
+        return Blanked("".join(parts), blanks)
+
+    def blank_all(self, sentences: Sequence[str]) -> List[Blanked]:
+        return [self.blank(sentence) for sentence in sentences]
+
+
+@lru_cache(maxsize=1024)
+def blanker_for(hanzi_phrase: str) -> Blanker:
+    """Blanker for a target phrase: the phrase itself and, if it is made of several
+    words, each of them, as sentences may contain them apart.
+    """
+
+    words = [word for word in jieba.cut(hanzi_phrase, cut_all=False) if word.strip()]
+    return Blanker([hanzi_phrase, *(words if len(words) > 1 else [])])
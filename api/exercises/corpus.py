@@ -0,0 +1,188 @@
+"""Local corpus of example sentences, searchable through an inverted index.
+
+Sentences are stored in an SQLite file together with a posting list mapping each
+jieba token to the sentences it appears in, so that looking up the sentences
+containing a phrase is an index lookup instead of a round of web scraping.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+import jieba
+
+
+DEFAULT_CORPUS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "sentences.sqlite3"
+)
+
+INDEX_VERSION = 1
+"""Version of `index_tokens`, stored as the file's `user_version`: files indexed by an
+older version are reindexed when opened.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sentence (
+    id INTEGER PRIMARY KEY,
+    hanzi TEXT NOT NULL UNIQUE,
+    translation TEXT,
+    pinyin TEXT
+);
+CREATE TABLE IF NOT EXISTS posting (
+    token TEXT NOT NULL,
+    sentence_id INTEGER NOT NULL REFERENCES sentence (id) ON DELETE CASCADE,
+    PRIMARY KEY (token, sentence_id)
+) WITHOUT ROWID;
+"""
+
+
+class Sentence(NamedTuple):
+    """An example sentence with its (optional) translation and pinyin."""
+
+    hanzi: str
+    translation: Optional[str] = None
+    pinyin: Optional[str] = None
+
+
+def index_tokens(text: str) -> Set[str]:
+    """Tokens under which a sentence is indexed.
+    Search mode also yields the shorter words inside long ones, so that a phrase is
+    found even when jieba segments the sentence around it differently.
+    """
+
+    tokens = {token for token in jieba.cut_for_search(text) if token.strip()}
+    # Single characters too, as a phrase of one character is a token of its own
+    #  even when search mode leaves it inside a word (好 in 好看).
+    return tokens | {char for token in tokens for char in token if char.strip()}
+
+
+def query_tokens(phrase: str) -> Set[str]:
+    """Tokens that must all be present in a sentence containing `phrase`."""
+    return {token for token in jieba.cut(phrase, cut_all=False) if token.strip()}
+
+
+class SentenceCorpus:
+    """An on-disk sentence store with an inverted index from token to sentence ids.
+
+    Connections are kept per thread, as SQLite connections cannot be shared.
+    """
+
+    def __init__(self, path: str = DEFAULT_CORPUS_PATH):
+        self.path = path
+        self._local = threading.local()
+
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version < INDEX_VERSION:
+                self._reindex(connection)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA foreign_keys = ON")
+            self._local.connection = connection
+
+        return connection
+
+    @staticmethod
+    def _reindex(connection: sqlite3.Connection):
+        connection.execute("DELETE FROM posting")
+        rows = connection.execute("SELECT id, hanzi FROM sentence").fetchall()
+        for sentence_id, hanzi in rows:
+            connection.executemany(
+                "INSERT OR IGNORE INTO posting (token, sentence_id) VALUES (?, ?)",
+                [(token, sentence_id) for token in index_tokens(hanzi)],
+            )
+        connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+    def __len__(self) -> int:
+        connection = self._connection()
+        (count,) = connection.execute("SELECT COUNT(*) FROM sentence").fetchone()
+        return count
+
+    def add(self, sentences: Iterable[Sentence]) -> int:
+        """Store and index the given sentences, skipping those already present.
+        Returns the number of sentences added.
+        """
+
+        added = 0
+        with self._connection() as connection:
+            for sentence in sentences:
+                hanzi = sentence.hanzi.strip()
+                if not hanzi:
+                    continue
+
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO sentence (hanzi, translation, pinyin)"
+                    " VALUES (?, ?, ?)",
+                    (hanzi, sentence.translation, sentence.pinyin),
+                )
+                if not cursor.rowcount:
+                    continue
+
+                connection.executemany(
+                    "INSERT OR IGNORE INTO posting (token, sentence_id) VALUES (?, ?)",
+                    [(token, cursor.lastrowid) for token in index_tokens(hanzi)],
+                )
+                added += 1
+
+        return added
+
+    def search(self, phrase: str, limit: Optional[int] = None) -> List[Sentence]:
+        """Find the sentences containing `phrase`.
+        Candidates are the sentences indexed under every token of the phrase; they are
+        then checked for the phrase itself, since tokens may appear out of order.
+        """
+
+        tokens = sorted(query_tokens(phrase))
+        if not tokens:
+            return []
+
+        placeholders = ", ".join("?" for _ in tokens)
+        query = (
+            "SELECT hanzi, translation, pinyin FROM sentence WHERE id IN ("
+            f" SELECT sentence_id FROM posting WHERE token IN ({placeholders})"
+            " GROUP BY sentence_id HAVING COUNT(*) = ?"
+            ") AND instr(hanzi, ?) > 0 ORDER BY id"
+        )
+        parameters = [*tokens, len(tokens), phrase]
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+
+        rows = self._connection().execute(query, parameters).fetchall()
+        return [Sentence(*row) for row in rows]
+
+
+_corpora: Dict[str, SentenceCorpus] = {}
+_corpora_lock = threading.Lock()
+
+
+def get_corpus(path: str = DEFAULT_CORPUS_PATH) -> SentenceCorpus:
+    """Return the corpus stored at `path`, opening it only once per process."""
+    with _corpora_lock:
+        if path not in _corpora:
+            _corpora[path] = SentenceCorpus(path)
+
+        return _corpora[path]
+
+
+def read_triples(lines: Iterable[str]) -> Iterable[Sentence]:
+    """Parse tab-separated `hanzi, translation, pinyin` lines.
+    Translation and pinyin are optional; blank lines and lines starting with # are
+    skipped.
+    """
+
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line.strip() or line.startswith("#"):
+            continue
+
+        fields = [field.strip() or None for field in line.split("\t")][:3]
+        if fields[0] is None:
+            continue
+
+        yield Sentence(*fields)
@@ -0,0 +1,202 @@
+"""Concurrent fetching of the pages scraped for exercises.
+
+All requests go through one keep-alive session, run in parallel on a thread pool and
+are throttled per host, so that fetching a batch of pages costs about one round-trip
+without hammering any single site. Pages are served from the page cache when
+possible, and revalidated against the site when the cached copy has expired.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed, wait
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from exercises.page_cache import PageCache, get_page_cache
+
+
+DEFAULT_WORKERS = 16
+DEFAULT_PER_HOST = 6
+DEFAULT_TIMEOUT = 10.0
+"""Timeout in seconds for connecting to a host and for each read from it."""
+DEFAULT_DEADLINE = 15.0
+"""Maximum time in seconds spent on a whole batch of pages."""
+
+
+class Fetcher:
+    """Fetches pages concurrently through a shared connection pool.
+
+    At most `per_host` requests run at the same time against one host; batches are
+    abandoned once `deadline` seconds have passed, and pages that could not be
+    fetched in time (or at all) are returned as None.
+    If a `cache` is given, fresh pages are read from it and only expired or missing
+    ones are requested; expired pages are still served if the site cannot be reached.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        per_host: int = DEFAULT_PER_HOST,
+        timeout: float = DEFAULT_TIMEOUT,
+        deadline: float = DEFAULT_DEADLINE,
+        cache: Optional[PageCache] = None,
+    ):
+        self.cache = cache
+        self.per_host = per_host
+        self.timeout = timeout
+        self.deadline = deadline
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(workers, per_host))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="fetch")
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+
+    def mount(self, prefix: str, adapter: BaseAdapter):
+        """Send requests for URLs starting with `prefix` through `adapter` instead,
+        e.g. to serve recorded pages in benchmarks.
+        """
+
+        self._session.mount(prefix, adapter)
+
+    def _slots(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+
+            return self._host_slots[host]
+
+    def _get(
+        self, url: str, expires_at: float, headers: Optional[Dict[str, str]] = None
+    ) -> Optional[requests.Response]:
+        """Perform one GET within the host's concurrency cap and the batch deadline."""
+        slots = self._slots(url)
+        if not slots.acquire(timeout=max(expires_at - time.monotonic(), 0)):
+            return None
+
+        try:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                return None
+
+            response = self._session.get(
+                url, headers=headers, timeout=min(self.timeout, remaining)
+            )
+            response.raise_for_status()
+            return response
+        except requests.RequestException:
+            return None
+        finally:
+            slots.release()
+
+    def _fetch(self, url: str, expires_at: float) -> Optional[bytes]:
+        if self.cache is None:
+            response = self._get(url, expires_at)
+            return response.content if response is not None else None
+
+        cached = self.cache.get(url)
+        if cached is not None and cached.fresh:
+            return cached.content
+
+        response = self._get(
+            url, expires_at, cached.validators() if cached is not None else None
+        )
+        if response is None:
+            return cached.content if cached is not None else None
+
+        if response.status_code == 304 and cached is not None:
+            self.cache.refresh(url)
+            return cached.content
+
+        self.cache.put(
+            url,
+            response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return response.content
+
+    def fetch(self, url: str) -> Optional[bytes]:
+        """Fetch a single page, returning its body or None on failure."""
+        return self._fetch(url, self.expiry())
+
+    def fetch_many(self, urls: Iterable[str]) -> List[Optional[bytes]]:
+        """Fetch pages in parallel, returning their bodies in the order of `urls`."""
+        expires_at = self.expiry()
+        futures = [self._executor.submit(self._fetch, url, expires_at) for url in urls]
+
+        wait(futures, timeout=max(expires_at - time.monotonic(), 0))
+        for future in futures:
+            future.cancel()
+
+        return [
+            future.result() if future.done() and not future.cancelled() else None
+            for future in futures
+        ]
+
+    def expiry(self) -> float:
+        """When a batch started now would expire, on the `time.monotonic` clock."""
+        return time.monotonic() + self.deadline
+
+    def stream(
+        self, urls: Iterable[str], expires_at: Optional[float] = None
+    ) -> Iterator[Tuple[str, Optional[bytes]]]:
+        """Fetch pages in parallel, yielding `(url, body)` pairs as soon as each page
+        is ready. Pages still pending are cancelled when the deadline passes or when
+        the caller stops iterating. Batches sharing a deadline are given the same
+        `expires_at`, from `expiry`; by default, the batch gets its own.
+        """
+
+        if expires_at is None:
+            expires_at = self.expiry()
+        futures = {
+            self._executor.submit(self._fetch, url, expires_at): url for url in urls
+        }
+
+        try:
+            for future in as_completed(
+                futures, timeout=max(expires_at - time.monotonic(), 0)
+            ):
+                yield futures[future], future.result()
+        except TimeoutError:
+            pass
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+_fetcher: Optional[Fetcher] = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher(config: Optional[Mapping] = None) -> Fetcher:
+    """Return the fetcher shared by the whole process, creating it on first use.
+    `config` is only read on creation, and may contain `EXERCISES_FETCH_WORKERS`,
+    `EXERCISES_FETCH_PER_HOST`, `EXERCISES_FETCH_TIMEOUT` and
+    `EXERCISES_FETCH_DEADLINE`, as well as the settings of the page cache (see
+    `get_page_cache`).
+    """
+
+    global _fetcher
+
+    with _fetcher_lock:
+        if _fetcher is None:
+            config = config or {}
+            _fetcher = Fetcher(
+                workers=int(config.get("EXERCISES_FETCH_WORKERS", DEFAULT_WORKERS)),
+                per_host=int(config.get("EXERCISES_FETCH_PER_HOST", DEFAULT_PER_HOST)),
+                timeout=float(config.get("EXERCISES_FETCH_TIMEOUT", DEFAULT_TIMEOUT)),
+                deadline=float(
+                    config.get("EXERCISES_FETCH_DEADLINE", DEFAULT_DEADLINE)
+                ),
+                cache=get_page_cache(config),
+            )
+
+        return _fetcher
@@ -0,0 +1,209 @@
+"""Background processing of fill-in-the-blank exercises.
+
+Jobs are stored in the `exercise_job` table, so that any worker can report on them, and
+run on a bounded thread pool in the worker which accepted them. Identical requests
+share the same job while it is in progress or its result has not expired.
+"""
+
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Mapping, Optional
+
+from flask import Flask
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ExerciseJob, JobStatus
+
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 32
+"""Maximum jobs waiting or running in one worker process."""
+DEFAULT_JOB_TIMEOUT = 10 * 60
+"""Seconds after which a job that did not finish is given up on."""
+DEFAULT_RESULT_TTL = 60 * 60
+"""Seconds for which the result of a job is kept."""
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+def job_key(
+    phrase: str, amount: int, difficulty_limit: float, user_id: Optional[int]
+) -> str:
+    key = f"{phrase}\0{amount}\0{difficulty_limit}\0{user_id}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def serialize_job(job: ExerciseJob) -> dict:
+    serialized = {
+        "id": job.id,
+        "status": JobStatus(job.status).name.lower(),
+        "phrase": job.phrase,
+        "amount": job.amount,
+        "limit": job.difficulty_limit,
+        "expires_at": job.expires_at.isoformat(),
+    }
+    if job.status == JobStatus.DONE.value:
+        serialized["result"] = job.result
+    elif job.status == JobStatus.FAILED.value:
+        serialized["message"] = (job.result or {}).get("message")
+
+    return serialized
+
+
+class JobQueue:
+    """Runs `run(phrase, amount, difficulty_limit, user_id)` in the background for each
+    job.
+    `run` is called within an app context and must return JSON-serialisable data.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[str, int, float, Optional[int]], object],
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        job_timeout: float = DEFAULT_JOB_TIMEOUT,
+        result_ttl: float = DEFAULT_RESULT_TTL,
+    ):
+        self.run = run
+        self.queue_size = queue_size
+        self.job_timeout = timedelta(seconds=job_timeout)
+        self.result_ttl = timedelta(seconds=result_ttl)
+
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="exercise-job")
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+
+    def find(self, job_id: int) -> Optional[ExerciseJob]:
+        """Return a job unless it does not exist or has expired."""
+        job = ExerciseJob.query.get(job_id)
+        if job is None or job.expires_at <= now():
+            return None
+
+        return job
+
+    def _find_by_key(self, key: str) -> Optional[ExerciseJob]:
+        return (
+            ExerciseJob.query.filter(
+                ExerciseJob.key == key,
+                ExerciseJob.status != JobStatus.FAILED.value,
+                ExerciseJob.expires_at > now(),
+            )
+            .order_by(ExerciseJob.id.desc())
+            .first()
+        )
+
+    def submit(
+        self,
+        app: Flask,
+        phrase: str,
+        amount: int,
+        difficulty_limit: float,
+        user_id: Optional[int] = None,
+    ) -> ExerciseJob:
+        """Return the job for this request, creating and scheduling it if needed.
+        Raises QueueFull if a new job is needed but this worker is at capacity.
+        """
+
+        ExerciseJob.query.filter(ExerciseJob.expires_at <= now()).delete()
+        db.session.commit()
+
+        key = job_key(phrase, amount, difficulty_limit, user_id)
+        existing = self._find_by_key(key)
+        if existing is not None:
+            return existing
+
+        with self._queued_lock:
+            if self._queued >= self.queue_size:
+                raise QueueFull()
+            self._queued += 1
+
+        job = ExerciseJob(
+            key=key,
+            phrase=phrase,
+            amount=amount,
+            difficulty_limit=difficulty_limit,
+            user_id=user_id,
+            status=JobStatus.PENDING.value,
+            expires_at=now() + self.job_timeout,
+        )
+        try:
+            db.session.add(job)
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created the same job in the meantime.
+            db.session.rollback()
+            self._done()
+            return self._find_by_key(key)
+
+        self._executor.submit(self._process, app, job.id)
+        return job
+
+    def _done(self):
+        with self._queued_lock:
+            self._queued -= 1
+
+    def _process(self, app: Flask, job_id: int):
+        with app.app_context():
+            try:
+                job = ExerciseJob.query.get(job_id)
+                job.status = JobStatus.RUNNING.value
+                db.session.commit()
+
+                try:
+                    job.result = self.run(
+                        job.phrase, job.amount, job.difficulty_limit, job.user_id
+                    )
+                    job.status = JobStatus.DONE.value
+                except Exception as e:
+                    db.session.rollback()
+                    job.result = {"message": f"Could not generate exercises: {e}"}
+                    job.status = JobStatus.FAILED.value
+
+                job.expires_at = now() + self.result_ttl
+                db.session.commit()
+            finally:
+                db.session.remove()
+                self._done()
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(
+    run: Callable[[str, int, float, Optional[int]], object],
+    config: Optional[Mapping] = None,
+) -> JobQueue:
+    """Return the job queue shared by the whole process, creating it on first use.
+    `config` is only read on creation, and may contain `EXERCISES_JOB_WORKERS`,
+    `EXERCISES_JOB_QUEUE_SIZE`, `EXERCISES_JOB_TIMEOUT` and `EXERCISES_JOB_RESULT_TTL`.
+    """
+
+    global _job_queue
+
+    with _job_queue_lock:
+        if _job_queue is None:
+            config = config or {}
+            _job_queue = JobQueue(
+                run,
+                workers=int(config.get("EXERCISES_JOB_WORKERS", DEFAULT_WORKERS)),
+                queue_size=int(
+                    config.get("EXERCISES_JOB_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)
+                ),
+                job_timeout=float(
+                    config.get("EXERCISES_JOB_TIMEOUT", DEFAULT_JOB_TIMEOUT)
+                ),
+                result_ttl=float(
+                    config.get("EXERCISES_JOB_RESULT_TTL", DEFAULT_RESULT_TTL)
+                ),
+            )
+
+        return _job_queue
@@ -0,0 +1,305 @@
+"""Disk-backed cache of scraped pages.
+
+Pages are kept in an SQLite file shared by all workers, keyed by normalised URL. Each
+host has its own time-to-live; once a page expires it is revalidated with its ETag or
+Last-Modified date when the site provided one. The cache is bounded in size and evicts
+the least recently used pages first.
+
+Lookups only read the file, so that fetch threads don't queue for SQLite's single
+write lock: hit and miss counters and access times are kept in memory, and written in
+batches along with the next change to the cache, or once enough of them are pending.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Mapping, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+DEFAULT_PAGE_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "page_cache.sqlite3"
+)
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_HOST_TTLS = {
+    # Sentences on jukuu practically never change.
+    "jukuu.com": 30 * 24 * 60 * 60,
+    "www.purpleculture.net": 7 * 24 * 60 * 60,
+}
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+"""Maximum size in bytes of the (compressed) pages kept in the cache."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page (
+    key TEXT PRIMARY KEY,
+    content BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_page_accessed_at ON page (accessed_at);
+CREATE TABLE IF NOT EXISTS counter (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+COUNTERS = ("hits", "misses", "revalidations", "evictions")
+FLUSH_EVERY = 256
+"""Lookups recorded in memory before they are written to the file."""
+FLUSH_INTERVAL = 30.0
+"""Seconds after which lookups recorded in memory are written to the file."""
+
+
+class CachedPage(NamedTuple):
+    content: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+    def validators(self) -> Dict[str, str]:
+        """Headers for a conditional request revalidating this page."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        return headers
+
+
+def normalise_url(url: str) -> str:
+    """Cache key for a URL: lowercase scheme and host, no default port, no fragment
+    and sorted query parameters.
+    """
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class PageCache:
+    """Persistent LRU cache of page bodies with per-host TTLs.
+
+    Connections are kept per thread, as SQLite connections cannot be shared.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PAGE_CACHE_PATH,
+        max_size: int = DEFAULT_MAX_SIZE,
+        default_ttl: float = DEFAULT_TTL,
+        host_ttls: Optional[Mapping[str, float]] = None,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.host_ttls = dict(DEFAULT_HOST_TTLS if host_ttls is None else host_ttls)
+        self._local = threading.local()
+        self._pending_lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._accessed: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+            connection.executemany(
+                "INSERT OR IGNORE INTO counter (name, value) VALUES (?, 0)",
+                [(name,) for name in COUNTERS],
+            )
+            # The total size of the pages, kept up to date by `put` and `_evict`.
+            connection.execute(
+                "INSERT OR IGNORE INTO counter (name, value)"
+                " SELECT 'size', COALESCE(SUM(size), 0) FROM page"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode = WAL")
+            self._local.connection = connection
+
+        return connection
+
+    def _count(self, name: str, amount: int = 1):
+        with self._pending_lock:
+            self._counts[name] += amount
+
+    def _flush_due(self) -> bool:
+        with self._pending_lock:
+            pending = sum(self._counts.values())
+            return pending >= FLUSH_EVERY or (
+                pending and time.monotonic() - self._flushed_at > FLUSH_INTERVAL
+            )
+
+    def _flush(self, connection: sqlite3.Connection):
+        """Write the counters and access times recorded in memory."""
+        with self._pending_lock:
+            counts, self._counts = self._counts, Counter()
+            accessed, self._accessed = self._accessed, {}
+            self._flushed_at = time.monotonic()
+
+        connection.executemany(
+            "UPDATE counter SET value = value + ? WHERE name = ?",
+            [(amount, name) for name, amount in counts.items() if amount],
+        )
+        connection.executemany(
+            "UPDATE page SET accessed_at = ? WHERE key = ? AND accessed_at < ?",
+            [(at, key, at) for key, at in accessed.items()],
+        )
+
+    def ttl(self, url: str) -> float:
+        host = (urlsplit(url).hostname or "").lower()
+        return self.host_ttls.get(host, self.default_ttl)
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Look a page up, counting a hit if it is still fresh and a miss otherwise."""
+        key = normalise_url(url)
+        now = time.time()
+
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT content, etag, last_modified, expires_at FROM page WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is not None:
+            content, etag, last_modified, expires_at = row
+            fresh = expires_at > now
+            with self._pending_lock:
+                self._accessed[key] = now
+        self._count("misses" if row is None or not fresh else "hits")
+
+        if self._flush_due():
+            with connection:
+                self._flush(connection)
+
+        if row is None:
+            return None
+        return CachedPage(zlib.decompress(content), etag, last_modified, fresh)
+
+    def put(
+        self,
+        url: str,
+        content: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        """Store a page, evicting the least recently used ones over the size limit."""
+        compressed = zlib.compress(content)
+        now = time.time()
+
+        key = normalise_url(url)
+        with self._connection() as connection:
+            # Updated first, as the write lock is taken on the first change.
+            connection.execute(
+                "UPDATE counter SET value = value + ?"
+                " - COALESCE((SELECT size FROM page WHERE key = ?), 0)"
+                " WHERE name = 'size'",
+                (len(compressed), key),
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO page"
+                " (key, content, size, etag, last_modified, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    compressed,
+                    len(compressed),
+                    etag,
+                    last_modified,
+                    now + self.ttl(url),
+                    now,
+                ),
+            )
+            self._flush(connection)
+            self._evict(connection)
+
+    def refresh(self, url: str):
+        """Mark a page as fresh again after the site confirmed it is unchanged."""
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE page SET expires_at = ?, accessed_at = ? WHERE key = ?",
+                (now + self.ttl(url), now, normalise_url(url)),
+            )
+            self._count("revalidations")
+            self._flush(connection)
+
+    def _evict(self, connection: sqlite3.Connection):
+        (total,) = connection.execute(
+            "SELECT value FROM counter WHERE name = 'size'"
+        ).fetchone()
+        if total <= self.max_size:
+            return
+
+        evicted = 0
+        freed = 0
+        while total > self.max_size:
+            rows = connection.execute(
+                "SELECT key, size FROM page ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+
+            for key, size in rows:
+                connection.execute("DELETE FROM page WHERE key = ?", (key,))
+                total -= size
+                freed += size
+                evicted += 1
+                if total <= self.max_size:
+                    break
+
+        connection.executemany(
+            "UPDATE counter SET value = value + ? WHERE name = ?",
+            [(-freed, "size"), (evicted, "evictions")],
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Counters shared by all processes using the cache, plus its current size.
+        Lookups other processes haven't written yet are not counted.
+        """
+
+        with self._connection() as connection:
+            self._flush(connection)
+        connection = self._connection()
+        stats = dict(connection.execute("SELECT name, value FROM counter").fetchall())
+        (stats["pages"],) = connection.execute("SELECT COUNT(*) FROM page").fetchone()
+
+        return stats
+
+
+_page_cache: Optional[PageCache] = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache(config: Optional[Mapping] = None) -> PageCache:
+    """Return the page cache shared by the whole process, creating it on first use.
+    `config` is only read on creation, and may contain `EXERCISES_PAGE_CACHE_PATH`,
+    `EXERCISES_PAGE_CACHE_SIZE`, `EXERCISES_PAGE_CACHE_TTL` and
+    `EXERCISES_PAGE_CACHE_HOST_TTLS`.
+    """
+
+    global _page_cache
+
+    with _page_cache_lock:
+        if _page_cache is None:
+            config = config or {}
+            _page_cache = PageCache(
+                path=config.get("EXERCISES_PAGE_CACHE_PATH", DEFAULT_PAGE_CACHE_PATH),
+                max_size=int(config.get("EXERCISES_PAGE_CACHE_SIZE", DEFAULT_MAX_SIZE)),
+                default_ttl=float(config.get("EXERCISES_PAGE_CACHE_TTL", DEFAULT_TTL)),
+                host_ttls=config.get("EXERCISES_PAGE_CACHE_HOST_TTLS"),
+            )
+
+        return _page_cache
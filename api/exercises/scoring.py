@@ -0,0 +1,143 @@
+"""Scoring of candidate sentences by how much of their vocabulary a learner knows.
+
+Each sentence is segmented once and its tokens are mapped to integer ids; the share of
+known tokens is then computed for the whole batch at once with NumPy, and only the
+best `amount` sentences are selected.
+"""
+
+import heapq
+import threading
+from typing import AbstractSet, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+import jieba
+import numpy as np
+
+from exercises.corpus import Sentence
+
+
+DEFAULT_LEXICON_SIZE = 1_000_000
+"""Number of tokens given ids before the lexicon starts over."""
+
+
+class TokenLexicon:
+    """Assigns each distinct token an integer id. Once `max_size` tokens have ids, new
+    batches are encoded with a fresh mapping, so that the lexicon doesn't grow for the
+    life of the process; batches keep the mapping they were encoded with.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_LEXICON_SIZE):
+        self.max_size = max_size
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def ids(self, tokens: Iterable[str]) -> Tuple[Dict[str, int], List[int]]:
+        """Ids of the given tokens, assigning new ones to tokens not seen before, with
+        the mapping they belong to.
+        """
+
+        with self._lock:
+            if len(self._ids) >= self.max_size:
+                self._ids = {}
+            ids = self._ids
+            return ids, [ids.setdefault(token, len(ids)) for token in tokens]
+
+    def known_mask(self, ids: Dict[str, int], words: AbstractSet[str]) -> np.ndarray:
+        """Bitset (as a boolean array indexed by token id) of the given words, among
+        the tokens of the mapping `ids`.
+        """
+
+        # Under the lock, as other threads may be adding tokens to the mapping.
+        with self._lock:
+            mask = np.zeros(len(ids), dtype=bool)
+            mask[[i for i in (ids.get(word) for word in words) if i is not None]] = True
+
+        return mask
+
+
+lexicon = TokenLexicon()
+
+
+class Batch(NamedTuple):
+    """Token ids of a batch of sentences, concatenated, with each sentence's offset,
+    and the mapping of tokens to ids they were encoded with.
+    """
+
+    token_ids: np.ndarray
+    offsets: np.ndarray
+    lengths: np.ndarray
+    ids: Dict[str, int]
+
+
+def tokenize(sentences: Sequence[Sentence]) -> List[List[str]]:
+    return [list(jieba.cut(sentence.hanzi, cut_all=False)) for sentence in sentences]
+
+
+def encode(tokenized: Sequence[Sequence[str]]) -> Batch:
+    lengths = np.fromiter((len(tokens) for tokens in tokenized), dtype=np.int64)
+    ids, token_ids = lexicon.ids(token for tokens in tokenized for token in tokens)
+    token_ids = np.array(token_ids, dtype=np.int64)
+    offsets = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+
+    return Batch(token_ids, offsets, lengths, ids)
+
+
+def coverage(batch: Batch, known_words: AbstractSet[str]) -> np.ndarray:
+    """Share of known tokens in each sentence of the batch."""
+    if not len(batch.lengths):
+        return np.zeros(0)
+
+    # The mask covers every token of the batch, which were added to its mapping first.
+    known = lexicon.known_mask(batch.ids, known_words)
+    is_known = known[batch.token_ids].astype(np.int64)
+
+    # reduceat misbehaves on empty segments, so those are given a score of zero.
+    counts = np.zeros(len(batch.lengths), dtype=np.int64)
+    non_empty = batch.lengths > 0
+    if len(is_known):
+        counts[non_empty] = np.add.reduceat(is_known, batch.offsets[non_empty])
+
+    return counts / np.maximum(batch.lengths, 1)
+
+
+def score(sentences: Sequence[Sentence], known_words: AbstractSet[str]) -> np.ndarray:
+    """Share of known tokens in each of the given sentences."""
+    return coverage(encode(tokenize(sentences)), known_words)
+
+
+def select(
+    scores: np.ndarray, amount: int, difficulty_limit: float, fallback: bool = True
+) -> List[int]:
+    """Indices of the best `amount` scores at or above `difficulty_limit`, best first.
+    If no score reaches the limit, the single best one is selected instead, unless
+    `fallback` is False.
+    """
+
+    if not len(scores) or amount <= 0:
+        return []
+
+    eligible = np.flatnonzero(scores >= difficulty_limit)
+    if not len(eligible):
+        return [int(np.argmax(scores))] if fallback else []
+
+    return heapq.nlargest(amount, eligible.tolist(), key=scores.__getitem__)
+
+
+def score_sentences(
+    sentences: Sequence[Sentence],
+    known_words: AbstractSet[str],
+    amount: int,
+    difficulty_limit: float,
+) -> List[tuple]:
+    """Select the sentences best suited to a learner knowing `known_words`.
+    Returns `(score, sentence)` pairs, best first.
+    """
+
+    scores = score(sentences, known_words)
+    return [
+        (float(scores[i]), sentences[i])
+        for i in select(scores, amount, difficulty_limit)
+    ]
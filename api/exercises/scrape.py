@@ -0,0 +1,185 @@
+"""Scraping of example sentences from jukuu and Purple Culture.
+
+Pages are fetched in parallel through the shared `Fetcher` and parsed as they arrive;
+parsing is kept separate from fetching so each site's markup is handled in one place.
+"""
+
+import math
+from contextlib import closing
+from typing import Iterator, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from exercises.corpus import Sentence
+from exercises.fetch import Fetcher, get_fetcher
+
+
+JUKUU_PAGES = 10
+PURPLE_RESULTS_PER_PAGE = 20
+PURPLE_MAX_PAGES = 30
+"""Limit to the pages searched, otherwise it could take forever for simple phrases."""
+
+
+class ScrapeFailed(Exception):
+    """None of the pages scraped for a phrase could be fetched."""
+
+
+def jukuu_url(hanzi_phrase: str, page: int) -> str:
+    return f"http://jukuu.com/show-{hanzi_phrase}-{page}.html"
+
+
+def purple_url(hanzi_phrase: str, page: int) -> str:
+    # Purple Culture supports different ways of looking up sentences - you can either
+    #  look up sentences that *contain* n words, or you can find sentences that have
+    #  n words - in a row.
+    purple_phrase = "+".join(hanzi_phrase)
+    return (
+        "https://www.purpleculture.net/sample-sentences/"
+        f"?word={purple_phrase}&page={page}"
+    )
+
+
+def parse_jukuu(content: bytes) -> List[Sentence]:
+    """Extract the sentences from a jukuu page.
+    jukuu supports the english meaning and 汉字, in consecutive rows.
+    """
+
+    soup = BeautifulSoup(content, "html.parser")
+
+    sentences = []
+    linked_output = []
+    for tr in soup.find_all("tr"):
+        if tr.has_attr("class") and list(tr["class"])[0] in ("e", "c"):
+            try:
+                linked_output.append(list(tr.children)[1].text.strip())
+            except IndexError:
+                linked_output = []
+
+        if len(linked_output) == 2:
+            english, chinese = linked_output
+            sentences.append(Sentence(hanzi=chinese, translation=english))
+            linked_output = []
+
+    return sentences
+
+
+def parse_purple_page_count(content: bytes) -> int:
+    """Number of result pages announced by the first Purple Culture page."""
+    soup = BeautifulSoup(content, "html.parser")
+    try:
+        header = soup.findAll("div", {"class": "card-header"})[0]
+        results = int(list(header.children)[1].text.split()[5])
+    except (IndexError, ValueError):
+        return 0
+
+    return min(math.ceil(results / PURPLE_RESULTS_PER_PAGE), PURPLE_MAX_PAGES)
+
+
+def parse_purple(content: bytes) -> List[Sentence]:
+    """Extract the sentences, with their pinyin, from a Purple Culture page."""
+    soup = BeautifulSoup(content, "html.parser")
+
+    sentences = []
+    for sentence in soup.find_all("li", {"class": "pb-4"}):
+        children = list(sentence.children)
+        words = list(children[0].children)
+        pinyin = ""
+        hanzi = ""
+
+        for x in range(len(words) - 1):
+            parts = list(words[x].children)
+            pinyin += parts[0].text.strip()
+            hanzi += parts[1].text.strip()
+
+        sentences.append(
+            Sentence(hanzi=hanzi, translation=children[3].text.strip(), pinyin=pinyin)
+        )
+
+    return sentences
+
+
+def _parse(parser, content: Optional[bytes]) -> List[Sentence]:
+    if content is None:
+        return []
+
+    try:
+        return parser(content)
+    except (AttributeError, IndexError):
+        # A page with unexpected markup is skipped, not the whole batch.
+        return []
+
+
+def _iter_pages(
+    hanzi_phrase: str, fetcher: Optional[Fetcher]
+) -> Iterator[Tuple[bool, List[Sentence]]]:
+    """Whether each page could be fetched, and its sentences, as in
+    `iter_scraped_pages`.
+    """
+
+    fetcher = fetcher or get_fetcher()
+    # Both batches share one deadline, so that a scrape takes at most that long.
+    expires_at = fetcher.expiry()
+
+    # jukuu is quite slow, but it has simpler sentences more suited to beginners
+    purple_first = purple_url(hanzi_phrase, 1)
+    page_count = 0
+    with closing(
+        fetcher.stream(
+            [jukuu_url(hanzi_phrase, page) for page in range(JUKUU_PAGES)]
+            + [purple_first],
+            expires_at,
+        )
+    ) as pages:
+        for url, content in pages:
+            if url != purple_first:
+                yield content is not None, _parse(parse_jukuu, content)
+                continue
+
+            if content is not None:
+                page_count = parse_purple_page_count(content)
+            yield content is not None, _parse(parse_purple, content)
+
+    with closing(
+        fetcher.stream(
+            [purple_url(hanzi_phrase, page) for page in range(2, page_count + 1)],
+            expires_at,
+        )
+    ) as pages:
+        for _, content in pages:
+            yield content is not None, _parse(parse_purple, content)
+
+
+def iter_scraped_pages(
+    hanzi_phrase: str, fetcher: Optional[Fetcher] = None
+) -> Iterator[List[Sentence]]:
+    """Scrapes example sentences for a phrase from jukuu and Purple Culture, yielding
+    the sentences of each page as soon as it is fetched.
+    The jukuu pages and the first Purple Culture page, which tells how many more
+    pages there are, are fetched together; the remaining Purple Culture pages are
+    then fetched in a second parallel batch, within the same deadline. Pages not
+    fetched yet are abandoned when the caller stops iterating.
+    """
+
+    with closing(_iter_pages(hanzi_phrase, fetcher)) as pages:
+        for _, sentences in pages:
+            yield sentences
+
+
+def scrape_sentences(
+    hanzi_phrase: str, fetcher: Optional[Fetcher] = None, strict: bool = False
+) -> List[Sentence]:
+    """Scrapes all example sentences for a phrase from jukuu and Purple Culture.
+    If `strict`, raises `ScrapeFailed` when no page could be fetched, rather than
+    returning no sentences as when the sites have none.
+    """
+
+    fetched = False
+    sentences = []
+    for page_fetched, page in _iter_pages(hanzi_phrase, fetcher):
+        fetched = fetched or page_fetched
+        sentences += page
+
+    if strict and not fetched:
+        raise ScrapeFailed(f"No page could be fetched for {hanzi_phrase}.")
+
+    return sentences
@@ -0,0 +1,53 @@
+"""Trees of learning resources, from `Resource.parent_id`.
+
+Subtrees and chains of ancestors are read with a recursive CTE walking the
+`ix_resource_parent_id` index, so that a whole course is fetched with one query
+rather than one per level. Walks stop at a maximum depth, which also keeps them from
+looping should `parent_id` ever form a cycle.
+"""
+
+from sqlalchemy import literal_column
+from sqlalchemy.orm import Query, aliased
+
+from models import db, Resource
+
+
+def _walk(resource_id: int, max_depth: int, down: bool) -> Query:
+    tree = (
+        db.session.query(
+            Resource.id.label("id"),
+            Resource.parent_id.label("parent_id"),
+            literal_column("0").label("depth"),
+        )
+        .filter(Resource.id == resource_id)
+        .cte("tree", recursive=True)
+    )
+    step = aliased(Resource, name="step")
+    tree = tree.union_all(
+        db.session.query(step.id, step.parent_id, tree.c.depth + 1).filter(
+            step.parent_id == tree.c.id if down else step.id == tree.c.parent_id,
+            tree.c.depth < max_depth,
+        )
+    )
+
+    return (
+        db.session.query(Resource, tree.c.depth)
+        .join(tree, Resource.id == tree.c.id)
+        .order_by(tree.c.depth, Resource.id)
+    )
+
+
+def subtree(resource_id: int, max_depth: int) -> Query:
+    """Query of `(resource, depth)` for a resource (at depth 0) and its descendants
+    down to `max_depth` levels below it, by depth then by ID.
+    """
+
+    return _walk(resource_id, max_depth, down=True)
+
+
+def ancestors(resource_id: int, max_depth: int) -> Query:
+    """Query of `(resource, depth)` for a resource (at depth 0) and its ancestors up to
+    `max_depth` levels above it, from the resource to the root.
+    """
+
+    return _walk(resource_id, max_depth, down=False)
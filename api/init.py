@@ -1,5 +1,7 @@
 """Factory functions to instantiate the app while avoiding circular imports."""
 
+from typing import Optional
+
 from flask import Flask
 from flask_restful import Api
 from flask_migrate import Migrate
@@ -8,10 +10,21 @@ from cors import cors
 from reroutes import reroutes
 from routes import routes
 from exercises.blank_fill import blank_exercises
+import auth
+import autocomplete
+import rate_limit
+import response_cache
+import tags
+import vocabulary
 from flask_jwt import JWT
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import safe_str_cmp
 
 
+DEFAULT_TRUSTED_PROXY_COUNT = 1
+"""Number of proxies in front of the app, trusted to set `X-Forwarded-For`."""
+
+
 class User:
     def __init__(self, id_, username, password):
         self.id = id_
@@ -42,21 +55,30 @@ def identity(payload):
     return userid_table.get(user_id, None)
 
 
-def create_app() -> Flask:
-    """Instantiate the app."""
+def create_app(overrides: Optional[dict] = None) -> Flask:
+    """Instantiate the app, with `overrides` taking precedence over local settings,
+    e.g. in tests.
+    """
     app = Flask(__name__, static_folder="../build", static_url_path="/")
 
     # Settings are loaded before and after extensions just in case some extensions
     #  need Flask settings to be already in place at init time.
-    load_settings(app)
+    load_settings(app, overrides)
     register_extensions(app)
-    load_settings(app)
+    load_settings(app, overrides)
+
+    # Clients' addresses are read from the `X-Forwarded-For` header set by the proxies
+    #  in front of the app, e.g. Heroku's router, as rate limits are per address.
+    proxies = int(app.config.get("TRUSTED_PROXY_COUNT", DEFAULT_TRUSTED_PROXY_COUNT))
+    if proxies > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies)
 
     return app
 
 
-def load_settings(app: Flask):
-    """Load all settings for the app from local_settings.py in a dict called `settings`.
+def load_settings(app: Flask, overrides: Optional[dict] = None):
+    """Load all settings for the app from local_settings.py in a dict called `settings`,
+    then from `overrides`.
     The operation is skipped if the file or the dict are not found, and Flask will use
     default configuration.
     
@@ -72,12 +94,20 @@ def load_settings(app: Flask):
     except (ImportError, AttributeError):
         pass
 
+    app.config.update(overrides or {})
+
 
 def register_extensions(app: Flask):
     """Register the database, any blueprint and other extensions."""
     db.init_app(app)
     Migrate(app, db)
     cors.init_app(app)
+    auth.configure(app.config)
+    autocomplete.configure(app.config)
+    rate_limit.configure(app.config)
+    response_cache.configure(app.config)
+    tags.configure(app.config)
+    vocabulary.configure(app.config)
 
     JWT(app, authentication_handler=authenticate, identity_handler=identity)
 
@@ -85,5 +115,14 @@ def register_extensions(app: Flask):
     app.register_blueprint(reroutes)
     app.register_blueprint(routes)
     app.register_blueprint(blank_exercises)
+    app.register_blueprint(auth.api_keys)
+    # Requests are limited per API key if they have a valid one, and per IP address
+    #  otherwise: those with an invalid or revoked key are charged before being
+    #  rejected, by `load_credentials` as for requests which aren't limited.
+    app.before_request(rate_limit.limit)
+    app.before_request(auth.load_credentials)
+    app.after_request(rate_limit.add_headers)
 
     Api(app)
+
+    autocomplete.warm_up(app)
@@ -0,0 +1,41 @@
+"""Lookup of lemmas by content, in bulk.
+
+Contents are sent as a single array parameter, so that resolving any number of strings
+takes one round-trip and one query plan, served by the `(content, type)` index.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
+
+from models import db, Lemma, LemmaType
+
+
+def resolve(
+    contents: Iterable[str], types: Optional[Sequence[LemmaType]] = None
+) -> Dict[str, List[int]]:
+    """Map each of `contents` to the IDs of the lemmas with that content, in ascending
+    order. If `types` are given, only lemmas having all of them are considered.
+    Contents without any such lemma are left out.
+    """
+
+    contents = list(set(contents))
+    if not contents:
+        return {}
+
+    query = (
+        db.session.query(
+            Lemma.content, db.func.array_agg(aggregate_order_by(Lemma.id, Lemma.id))
+        )
+        .filter(
+            Lemma.content
+            == any_(bindparam("contents", contents, type_=ARRAY(db.String)))
+        )
+        .group_by(Lemma.content)
+    )
+    if types:
+        query = query.filter(Lemma.type_.contains([type_.value for type_ in types]))
+
+    return dict(query.all())
+
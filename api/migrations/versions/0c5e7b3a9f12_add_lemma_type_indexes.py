@@ -0,0 +1,33 @@
+"""Add indexes on lemma type.
+
+Revision ID: 0c5e7b3a9f12
+Revises: f3a9c2d8e614
+Create Date: 2026-10-18 17:03:18.924570
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0c5e7b3a9f12"
+down_revision = "f3a9c2d8e614"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The composite index also serves lookups by content alone.
+    op.create_index(
+        "ix_lemma_content_type", "lemma", ["content", "type"], unique=False
+    )
+    op.drop_index("ix_lemma_content", table_name="lemma")
+    op.create_index(
+        "ix_lemma_type", "lemma", ["type"], unique=False, postgresql_using="gin"
+    )
+
+
+def downgrade():
+    op.drop_index("ix_lemma_type", table_name="lemma")
+    op.create_index("ix_lemma_content", "lemma", ["content"], unique=False)
+    op.drop_index("ix_lemma_content_type", table_name="lemma")
@@ -0,0 +1,44 @@
+"""Add indexes for keyset pagination.
+
+Revision ID: 1b7f0e5c9d23
+Revises: a4d7c3e91f58
+Create Date: 2026-10-18 14:02:41.316207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "1b7f0e5c9d23"
+down_revision = "a4d7c3e91f58"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_lemma_creation_date_id", "lemma", ["creation_date", "id"], unique=False
+    )
+    op.create_index(
+        "ix_resource_creation_date_id",
+        "resource",
+        ["creation_date", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_resource_votes_id",
+        "resource",
+        [sa.text("(upvotes - downvotes)"), "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_review_creation_date_id", "review", ["creation_date", "id"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index("ix_review_creation_date_id", table_name="review")
+    op.drop_index("ix_resource_votes_id", table_name="resource")
+    op.drop_index("ix_resource_creation_date_id", table_name="resource")
+    op.drop_index("ix_lemma_creation_date_id", table_name="lemma")
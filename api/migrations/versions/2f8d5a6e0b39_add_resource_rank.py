@@ -0,0 +1,44 @@
+"""Add Wilson score rank to resources.
+
+Revision ID: 2f8d5a6e0b39
+Revises: 9e4b6c1f2a85
+Create Date: 2026-10-18 19:05:52.201846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2f8d5a6e0b39"
+down_revision = "9e4b6c1f2a85"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lower bound of the Wilson score interval at 95% confidence (z = 1.96) for the
+    #  share of upvotes; 0 without votes.
+    op.execute(
+        """
+        CREATE FUNCTION wilson_lower_bound(up bigint, down bigint)
+        RETURNS double precision AS $$
+            SELECT CASE WHEN up + down <= 0 THEN 0 ELSE GREATEST(0, (
+                up::float / (up + down) + 1.9208 / (up + down)
+                - 1.96 * sqrt(up::float * down / (up + down) + 0.9604) / (up + down)
+            ) / (1 + 3.8416 / (up + down))) END;
+        $$ LANGUAGE sql IMMUTABLE;
+        """
+    )
+    op.add_column(
+        "resource",
+        sa.Column("rank", sa.Float(), server_default=sa.text("0"), nullable=False),
+    )
+    op.execute("UPDATE resource SET rank = wilson_lower_bound(upvotes, downvotes)")
+    op.create_index("ix_resource_rank_id", "resource", ["rank", "id"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_resource_rank_id", table_name="resource")
+    op.drop_column("resource", "rank")
+    op.execute("DROP FUNCTION wilson_lower_bound(bigint, bigint)")
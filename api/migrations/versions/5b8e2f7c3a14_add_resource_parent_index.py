@@ -0,0 +1,23 @@
+"""Index resources by parent.
+
+Revision ID: 5b8e2f7c3a14
+Revises: c4f81b2d6a93
+Create Date: 2026-10-18 21:48:15.270394
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "5b8e2f7c3a14"
+down_revision = "c4f81b2d6a93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_resource_parent_id", "resource", ["parent_id"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_resource_parent_id", table_name="resource")
@@ -0,0 +1,91 @@
+"""Add tag IDs to resources, maintained by a trigger.
+
+Revision ID: 6d2a8f4b1c07
+Revises: 1b7f0e5c9d23
+Create Date: 2026-10-18 15:11:09.482615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "6d2a8f4b1c07"
+down_revision = "1b7f0e5c9d23"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "resource",
+        sa.Column(
+            "tag_ids",
+            postgresql.ARRAY(sa.Integer()),
+            server_default=sa.text("'{}'"),
+            nullable=False,
+        ),
+    )
+
+    # The tags of a resource are recomputed whenever one of its rows in the
+    #  association table changes, including through the cascades from tag deletions.
+    op.execute(
+        """
+        CREATE FUNCTION refresh_resource_tag_ids(changed_id integer) RETURNS void AS $$
+            UPDATE resource SET tag_ids = COALESCE(
+                (
+                    SELECT array_agg(tag_id ORDER BY tag_id)
+                    FROM tags_to_resources_mtm
+                    WHERE resource_id = changed_id
+                ),
+                '{}'
+            )
+            WHERE id = changed_id;
+        $$ LANGUAGE sql;
+
+        CREATE FUNCTION resource_tags_changed() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM refresh_resource_tag_ids(NEW.resource_id);
+            END IF;
+            IF TG_OP = 'DELETE'
+                    OR (TG_OP = 'UPDATE' AND OLD.resource_id <> NEW.resource_id) THEN
+                PERFORM refresh_resource_tag_ids(OLD.resource_id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER resource_tags_changed
+            AFTER INSERT OR UPDATE OR DELETE ON tags_to_resources_mtm
+            FOR EACH ROW EXECUTE PROCEDURE resource_tags_changed();
+
+        UPDATE resource SET tag_ids = tags.ids
+        FROM (
+            SELECT resource_id, array_agg(tag_id ORDER BY tag_id) AS ids
+            FROM tags_to_resources_mtm
+            GROUP BY resource_id
+        ) AS tags
+        WHERE resource.id = tags.resource_id;
+        """
+    )
+    op.create_index(
+        "ix_resource_tag_ids",
+        "resource",
+        ["tag_ids"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade():
+    op.drop_index("ix_resource_tag_ids", table_name="resource")
+    op.execute(
+        """
+        DROP TRIGGER resource_tags_changed ON tags_to_resources_mtm;
+        DROP FUNCTION resource_tags_changed();
+        DROP FUNCTION refresh_resource_tag_ids(integer);
+        """
+    )
+    op.drop_column("resource", "tag_ids")
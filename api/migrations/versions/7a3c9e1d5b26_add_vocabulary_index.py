@@ -0,0 +1,30 @@
+"""Index user vocabularies by user.
+
+Revision ID: 7a3c9e1d5b26
+Revises: 2f8d5a6e0b39
+Create Date: 2026-10-18 20:12:37.518204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "7a3c9e1d5b26"
+down_revision = "2f8d5a6e0b39"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_lemmas_to_users_mtm_user_id_lemma_id",
+        "lemmas_to_users_mtm",
+        ["user_id", "lemma_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_lemmas_to_users_mtm_user_id_lemma_id", table_name="lemmas_to_users_mtm"
+    )
@@ -0,0 +1,50 @@
+"""Add full-text search vectors to reviews and resource names.
+
+Revision ID: 8c2d4f6a1e97
+Revises: 5b8e2f7c3a14
+Create Date: 2026-10-18 22:31:06.742918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "8c2d4f6a1e97"
+down_revision = "5b8e2f7c3a14"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Vectors are computed by the app, as texts are segmented with jieba: run
+    #  `flask resources index-search` after upgrading to index existing rows.
+    op.add_column(
+        "resource_name",
+        sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True),
+    )
+    op.add_column(
+        "review", sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True)
+    )
+    op.create_index(
+        "ix_resource_name_search_vector",
+        "resource_name",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "ix_review_search_vector",
+        "review",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade():
+    op.drop_index("ix_review_search_vector", table_name="review")
+    op.drop_index("ix_resource_name_search_vector", table_name="resource_name")
+    op.drop_column("review", "search_vector")
+    op.drop_column("resource_name", "search_vector")
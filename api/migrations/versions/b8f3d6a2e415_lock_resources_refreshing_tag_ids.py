@@ -0,0 +1,61 @@
+"""Lock resources before refreshing their tag IDs.
+
+Revision ID: b8f3d6a2e415
+Revises: d5e8a1f3c720
+Create Date: 2026-10-19 11:05:38.217094
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "b8f3d6a2e415"
+down_revision = "d5e8a1f3c720"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Concurrent changes to the tags of a resource wait for each other on its row, and
+    #  the array is then aggregated by a new statement, seeing the changes committed
+    #  meanwhile. FOR NO KEY UPDATE doesn't conflict with the key share locks taken by
+    #  the foreign keys of the association rows being inserted, so it can't deadlock
+    #  with them.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_resource_tag_ids(changed_id integer)
+        RETURNS void AS $$
+        BEGIN
+            PERFORM 1 FROM resource WHERE id = changed_id FOR NO KEY UPDATE;
+            UPDATE resource SET tag_ids = COALESCE(
+                (
+                    SELECT array_agg(tag_id ORDER BY tag_id)
+                    FROM tags_to_resources_mtm
+                    WHERE resource_id = changed_id
+                ),
+                '{}'
+            )
+            WHERE id = changed_id;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_resource_tag_ids(changed_id integer)
+        RETURNS void AS $$
+            UPDATE resource SET tag_ids = COALESCE(
+                (
+                    SELECT array_agg(tag_id ORDER BY tag_id)
+                    FROM tags_to_resources_mtm
+                    WHERE resource_id = changed_id
+                ),
+                '{}'
+            )
+            WHERE id = changed_id;
+        $$ LANGUAGE sql;
+        """
+    )
@@ -0,0 +1,96 @@
+"""Log changes to user vocabularies, maintained by triggers.
+
+Revision ID: c4f81b2d6a93
+Revises: 7a3c9e1d5b26
+Create Date: 2026-10-18 21:03:48.905137
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c4f81b2d6a93"
+down_revision = "7a3c9e1d5b26"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE SEQUENCE vocabulary_version_seq")
+    op.create_table(
+        "vocabulary_change",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("lemma_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "version",
+            sa.BigInteger(),
+            server_default=sa.text("nextval('vocabulary_version_seq')"),
+            nullable=False,
+        ),
+        sa.Column("known", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["lemma_id"], ["lemma.id"], onupdate="CASCADE", ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"], ["user.id"], onupdate="CASCADE", ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("user_id", "lemma_id"),
+    )
+    # Dropped along with the table.
+    op.execute(
+        "ALTER SEQUENCE vocabulary_version_seq OWNED BY vocabulary_change.version"
+    )
+
+    # One statement-level trigger per operation, so that bulk changes to the
+    #  association table are logged with a single upsert rather than row by row.
+    op.execute(
+        """
+        CREATE FUNCTION log_vocabulary_changes() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO vocabulary_change (user_id, lemma_id, known)
+            SELECT user_id, lemma_id, TG_OP = 'INSERT'
+            FROM changed
+            ORDER BY user_id, lemma_id
+            ON CONFLICT (user_id, lemma_id) DO UPDATE
+            SET known = EXCLUDED.known, version = EXCLUDED.version;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER vocabulary_added
+            AFTER INSERT ON lemmas_to_users_mtm
+            REFERENCING NEW TABLE AS changed
+            FOR EACH STATEMENT EXECUTE PROCEDURE log_vocabulary_changes();
+
+        CREATE TRIGGER vocabulary_removed
+            AFTER DELETE ON lemmas_to_users_mtm
+            REFERENCING OLD TABLE AS changed
+            FOR EACH STATEMENT EXECUTE PROCEDURE log_vocabulary_changes();
+
+        INSERT INTO vocabulary_change (user_id, lemma_id, known)
+        SELECT user_id, lemma_id, true
+        FROM lemmas_to_users_mtm
+        ORDER BY user_id, lemma_id;
+        """
+    )
+    op.create_index(
+        "ix_vocabulary_change_user_id_version",
+        "vocabulary_change",
+        ["user_id", "version"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        DROP TRIGGER vocabulary_removed ON lemmas_to_users_mtm;
+        DROP TRIGGER vocabulary_added ON lemmas_to_users_mtm;
+        DROP FUNCTION log_vocabulary_changes();
+        """
+    )
+    op.drop_index(
+        "ix_vocabulary_change_user_id_version", table_name="vocabulary_change"
+    )
+    op.drop_table("vocabulary_change")
@@ -0,0 +1,49 @@
+"""Store the tokens of banked exercise sentences instead of their lemma IDs.
+
+Revision ID: d5e8a1f3c720
+Revises: e1a7b5c3d902
+Create Date: 2026-10-19 10:42:17.604385
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "d5e8a1f3c720"
+down_revision = "e1a7b5c3d902"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The bank is derived data: it is emptied, to be rebuilt by
+    #  `flask exercises build-bank`, rather than segmented again here.
+    op.execute("DELETE FROM exercise_sentence")
+    op.execute("DELETE FROM exercise_bank_status")
+    op.add_column(
+        "exercise_sentence",
+        sa.Column("tokens", postgresql.ARRAY(sa.String()), nullable=False),
+    )
+    op.drop_column("exercise_sentence", "token_count")
+    op.drop_column("exercise_sentence", "free_count")
+    op.drop_column("exercise_sentence", "token_ids")
+
+
+def downgrade():
+    op.execute("DELETE FROM exercise_sentence")
+    op.execute("DELETE FROM exercise_bank_status")
+    op.add_column(
+        "exercise_sentence",
+        sa.Column("token_ids", postgresql.ARRAY(sa.Integer()), nullable=False),
+    )
+    op.add_column(
+        "exercise_sentence",
+        sa.Column("free_count", sa.SmallInteger(), nullable=False),
+    )
+    op.add_column(
+        "exercise_sentence",
+        sa.Column("token_count", sa.SmallInteger(), nullable=False),
+    )
+    op.drop_column("exercise_sentence", "tokens")
@@ -0,0 +1,38 @@
+"""Store hashes of API keys instead of the keys.
+
+Revision ID: e1a7b5c3d902
+Revises: 8c2d4f6a1e97
+Create Date: 2026-10-18 23:14:52.318760
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e1a7b5c3d902"
+down_revision = "8c2d4f6a1e97"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("api_key", sa.Column("key_hash", sa.String(length=64), nullable=True))
+    # Hex SHA-256 of the UTF-8 key, as computed by auth.hash_key.
+    op.execute(
+        "UPDATE api_key SET key_hash = encode(sha256(convert_to(key, 'UTF8')), 'hex')"
+    )
+    op.alter_column("api_key", "key_hash", nullable=False)
+    op.create_unique_constraint("api_key_key_hash_key", "api_key", ["key_hash"])
+    op.drop_column("api_key", "key")
+
+
+def downgrade():
+    # Keys cannot be recovered from their hashes: existing keys stop working and must
+    #  be issued again.
+    op.add_column("api_key", sa.Column("key", sa.String(), nullable=True))
+    op.execute("UPDATE api_key SET key = key_hash")
+    op.alter_column("api_key", "key", nullable=False)
+    op.create_unique_constraint("api_key_key_key", "api_key", ["key"])
+    op.drop_constraint("api_key_key_hash_key", "api_key", type_="unique")
+    op.drop_column("api_key", "key_hash")
@@ -0,0 +1,34 @@
+"""Add indexes on lemma content.
+
+Revision ID: f3a9c2d8e614
+Revises: 6d2a8f4b1c07
+Create Date: 2026-10-18 16:24:50.107338
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f3a9c2d8e614"
+down_revision = "6d2a8f4b1c07"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index("ix_lemma_content", "lemma", ["content"], unique=False)
+    op.create_index(
+        "ix_lemma_content_trgm",
+        "lemma",
+        ["content"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"content": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.drop_index("ix_lemma_content_trgm", table_name="lemma")
+    op.drop_index("ix_lemma_content", table_name="lemma")
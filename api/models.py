@@ -2,7 +2,7 @@
 
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.sql import text
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 import enum
 
 
@@ -34,6 +34,8 @@ lemmas_helper = db.Table(
     "lemmas_to_users_mtm",
     db.Column("lemma_id", db.Integer, db.ForeignKey("lemma.id"), primary_key=True),
     db.Column("user_id", db.Integer, db.ForeignKey("user.id"), primary_key=True),
+    # To read a user's vocabulary in lemma order with index-only scans.
+    db.Index("ix_lemmas_to_users_mtm_user_id_lemma_id", "user_id", "lemma_id"),
 )
 
 
@@ -54,7 +56,7 @@ class LemmaType(enum.Enum):
     IDIOM = 5
 
 
-class Lemma(BaseModel, db.Model):
+class Lemma(BaseModel, DatedModel, ModifiableModel, db.Model):
     """A single lemma: a word, idiom, expression or grammatical construction."""
 
     # `content` is not set as unique because there might be lemmas of different kinds
@@ -66,6 +68,21 @@ class Lemma(BaseModel, db.Model):
     type_ = db.Column(ARRAY(db.SmallInteger), name="type", default=[])
     # TODO difficulty index, depending on how we decide to implement that
 
+    __table_args__ = (
+        # Listings are paginated by `(sort key, id)`, see pagination.py.
+        db.Index("ix_lemma_creation_date_id", "creation_date", "id"),
+        # Also serves lookups by content alone, as its first column.
+        db.Index("ix_lemma_content_type", "content", "type"),
+        db.Index("ix_lemma_type", "type", postgresql_using="gin"),
+        # Serves substring searches (LIKE '%...%'), for patterns of 3+ characters.
+        db.Index(
+            "ix_lemma_content_trgm",
+            "content",
+            postgresql_using="gin",
+            postgresql_ops={"content": "gin_trgm_ops"},
+        ),
+    )
+
 
 class User(BaseModel, DatedModel, db.Model):
     """A user on the platform."""
@@ -73,14 +90,56 @@ class User(BaseModel, DatedModel, db.Model):
     email = db.Column(db.String, unique=True, nullable=False)
     password = db.Column(db.String, nullable=False)
     salt = db.Column(db.String, nullable=False)
+    # Loaded on access only, as vocabularies can hold thousands of lemmas: read them
+    #  through vocabulary.py rather than from loaded users.
     lemmas = db.relationship(
-        "Lemma", secondary=lemmas_helper, lazy="subquery", backref="users"
+        "Lemma", secondary=lemmas_helper, lazy=True, backref="users"
     )
 
     def __repr__(self):
         return f"<Users {self.email}>"
 
 
+vocabulary_version_seq = db.Sequence("vocabulary_version_seq")
+
+
+class VocabularyChange(db.Model):
+    """The latest change to whether a user knows a lemma, to sync vocabularies.
+    Rows are written by a trigger on `lemmas_to_users_mtm`, so they must never be
+    written to directly; each change takes the next `version` from a sequence shared
+    by all users, see vocabulary.py.
+    """
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    lemma_id = db.Column(
+        db.Integer,
+        db.ForeignKey("lemma.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    version = db.Column(
+        db.BigInteger,
+        vocabulary_version_seq,
+        nullable=False,
+        server_default=vocabulary_version_seq.next_value(),
+    )
+    known = db.Column(db.Boolean, nullable=False)
+
+    # Serves the changes to a user's vocabulary since a version.
+    __table_args__ = (
+        db.Index("ix_vocabulary_change_user_id_version", "user_id", "version"),
+    )
+
+    def __repr__(self):
+        return (
+            f"<Vocabulary change {self.version}: user {self.user_id} "
+            f"{'knows' if self.known else 'forgot'} lemma {self.lemma_id}>"
+        )
+
+
 class PermLevel(enum.IntEnum):
     """Actions permitted by a certain key.
     
@@ -98,16 +157,18 @@ class PermLevel(enum.IntEnum):
 
 
 class APIKey(BaseModel, DatedModel, db.Model):
-    """An API-key associated to a user and needed to access the API."""
+    """An API-key associated to a user and needed to access the API.
+    Keys themselves are not stored, only their SHA-256 hash: see auth.py.
+    """
 
-    key = db.Column(db.String, unique=True, nullable=False)
+    key_hash = db.Column(db.String(64), unique=True, nullable=False)
     level = db.Column(db.SmallInteger, nullable=False, default=PermLevel.READ.value)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
 
     def __repr__(self):
         return (
-            f"<API key for user"
-            f" {self.user_id} ({'invalid' if self.is_revoked else 'valid'})>"
+            f"<API key for user {self.user_id}"
+            f" ({PermLevel(self.level).name if self.level is not None else 'new'})>"
         )
 
 
@@ -134,16 +195,80 @@ class Resource(BaseModel, DatedModel, db.Model):
 
     upvotes = db.Column(db.Integer, nullable=False, default=0)
     downvotes = db.Column(db.Integer, nullable=False, default=0)
+    # Lower bound of the Wilson score interval of the share of upvotes, to sort by
+    #  quality. Updated along with the vote counters, see votes.py.
+    rank = db.Column(db.Float, nullable=False, server_default=text("0"))
     names = db.relationship("ResourceName", backref="resource", lazy=True)
-    urls = db.relationship("ResourceURL", backref="resource", lazy=True)
-    tags = db.relationship(
-        "Tag", secondary=tags_helper, lazy="subquery", backref="resources"
+    urls = db.relationship("ResourceUrl", backref="resource", lazy=True)
+    # Relationships are loaded on access, or with the query where they are needed
+    #  (see serialization.py), so that loading resources doesn't load them all.
+    tags = db.relationship("Tag", secondary=tags_helper, lazy=True, backref="resources")
+    # Sorted IDs of `tags`, kept up to date by a trigger on `tags_to_resources_mtm`
+    #  so that resources can be filtered by tag through a GIN index. Read-only.
+    tag_ids = db.Column(
+        ARRAY(db.Integer), nullable=False, server_default=text("'{}'"),
     )
     parent_id = db.Column(
         db.Integer,
         db.ForeignKey("resource.id", onupdate="CASCADE", ondelete="CASCADE"),
         nullable=True,
     )
+    children = db.relationship(
+        "Resource", backref=db.backref("parent", remote_side="Resource.id"), lazy=True
+    )
+
+    __table_args__ = (
+        db.Index("ix_resource_creation_date_id", "creation_date", "id"),
+        db.Index("ix_resource_tag_ids", "tag_ids", postgresql_using="gin"),
+        db.Index("ix_resource_rank_id", "rank", "id"),
+        # Serves the walks down resource trees, see hierarchy.py.
+        db.Index("ix_resource_parent_id", "parent_id"),
+    )
+
+
+db.Index(
+    "ix_resource_votes_id", Resource.upvotes - Resource.downvotes, Resource.id,
+)
+
+
+class VoteValue(enum.IntEnum):
+    """Kind of vote on a resource.
+
+    Remember to use VoteValue.SOMEVALUE.value; see documentation on LemmaType enum.
+    Do NOT modify existing values in this enum or consistency with values in the
+    database will be lost.
+    """
+
+    DOWN = -1
+    UP = 1
+
+
+class Vote(DatedModel, db.Model):
+    """A user's vote on a learning resource. Users have at most one vote per resource.
+    Votes are counted in `Resource.upvotes` and `Resource.downvotes` asynchronously,
+    see votes.py.
+    """
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    resource_id = db.Column(
+        db.Integer,
+        db.ForeignKey("resource.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    value = db.Column(db.SmallInteger, nullable=False)
+
+    # Serves the recount of each resource's votes.
+    __table_args__ = (db.Index("ix_vote_resource_id_value", "resource_id", "value"),)
+
+    def __repr__(self):
+        return (
+            f"<{VoteValue(self.value).name.capitalize()}vote by user {self.user_id}"
+            f" on resource {self.resource_id}>"
+        )
 
 
 class ResourceName(BaseModel, db.Model):
@@ -155,6 +280,14 @@ class ResourceName(BaseModel, db.Model):
         db.ForeignKey("resource.id", onupdate="CASCADE", ondelete="CASCADE"),
         nullable=False,
     )
+    # Words of `value` segmented with jieba, set on write by search.py.
+    search_vector = db.deferred(db.Column(TSVECTOR, nullable=True))
+
+    __table_args__ = (
+        db.Index(
+            "ix_resource_name_search_vector", "search_vector", postgresql_using="gin"
+        ),
+    )
 
     def __repr__(self):
         return f"<Resource Name {self.value} for ID {self.resource_id}>"
@@ -197,3 +330,89 @@ class Review(BaseModel, DatedModel, ModifiableModel, db.Model):
         db.ForeignKey("user.id", onupdate="CASCADE", ondelete="CASCADE"),
         nullable=False,
     )
+    # Words of `content` segmented with jieba, set on write by search.py.
+    search_vector = db.deferred(db.Column(TSVECTOR, nullable=True))
+
+    __table_args__ = (
+        db.Index("ix_review_creation_date_id", "creation_date", "id"),
+        db.Index("ix_review_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+
+# Models and tables for exercises.
+class JobStatus(enum.IntEnum):
+    """State of a background job.
+
+    Remember to use JobStatus.SOMEVALUE.value; see documentation on LemmaType enum.
+    Do NOT modify existing values in this enum or consistency with values in the
+    database will be lost.
+    """
+
+    PENDING = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+
+
+class ExerciseJob(BaseModel, DatedModel, db.Model):
+    """A request for fill-in-the-blank exercises, processed in the background."""
+
+    # Identical requests share the same key, so that they can share a job too.
+    key = db.Column(db.String, nullable=False, index=True)
+    phrase = db.Column(db.String, nullable=False)
+    amount = db.Column(db.Integer, nullable=False)
+    difficulty_limit = db.Column(db.Float, nullable=False)
+    # Whose vocabulary exercises are scored against, if anyone's.
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", onupdate="CASCADE", ondelete="CASCADE"),
+        nullable=True,
+    )
+    status = db.Column(db.SmallInteger, nullable=False, default=JobStatus.PENDING.value)
+    result = db.Column(JSONB, nullable=True)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # At most one job per key can be in progress at any time.
+        db.Index(
+            "ix_exercise_job_key_active",
+            "key",
+            unique=True,
+            postgresql_where=text(f"status < {JobStatus.DONE.value}"),
+        ),
+    )
+
+    def __repr__(self):
+        status = JobStatus(self.status).name
+        return f"<Exercise job {self.id} for {self.phrase} ({status})>"
+
+
+class ExerciseSentence(BaseModel, db.Model):
+    """An example sentence for a lemma, precomputed for fill-in-the-blank exercises."""
+
+    lemma_id = db.Column(
+        db.Integer,
+        db.ForeignKey("lemma.id", onupdate="CASCADE", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    hanzi = db.Column(db.String, nullable=False)
+    translation = db.Column(db.String, nullable=True)
+    pinyin = db.Column(db.String, nullable=True)
+    # The sentence segmented by jieba, scored against learners' vocabularies as the
+    #  sentences of live exercises are.
+    tokens = db.Column(ARRAY(db.String), nullable=False, default=[])
+
+    def __repr__(self):
+        return f"<Exercise sentence for lemma {self.lemma_id}: {self.hanzi}>"
+
+
+class ExerciseBankStatus(db.Model):
+    """When the exercise sentences of a lemma were last built."""
+
+    lemma_id = db.Column(
+        db.Integer,
+        db.ForeignKey("lemma.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    built_date = db.Column(db.DateTime(timezone=True), nullable=False)
@@ -0,0 +1,174 @@
+"""Keyset pagination of listing endpoints.
+
+Results are ordered by a sort key and then by ID, and each page ends with an opaque
+cursor holding the `(sort key, id)` of its last row; the next page is the rows after
+that pair. Unlike an OFFSET, this only reads the rows returned, so with an index on
+`(sort key, id)` every page costs the same however deep a client pages.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Mapping, NamedTuple, Optional, Tuple
+
+from flask import request
+from flask_restful import abort
+from sqlalchemy import tuple_
+from werkzeug.urls import url_encode
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 100
+
+
+class SortKey(NamedTuple):
+    """A way to order a listing: the SQL expression to order by, how to read its value
+    from a row, and how to turn the value back from JSON, as stored in cursors.
+    """
+
+    expression: Any
+    value: Callable[[Any], Any]
+    load: Callable[[Any], Any] = lambda value: value
+
+
+def id_key(model) -> SortKey:
+    return SortKey(model.id, lambda row: row.id, int)
+
+
+def creation_date_key(model) -> SortKey:
+    return SortKey(
+        model.creation_date,
+        lambda row: row.creation_date.isoformat(),
+        datetime.fromisoformat,
+    )
+
+
+class Cursor(NamedTuple):
+    """Position after the last row of a page, for a given ordering."""
+
+    sort: str
+    descending: bool
+    value: Any
+    id: int
+
+    def encode(self) -> str:
+        data = json.dumps(list(self), separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "Cursor":
+        """Raises ValueError if `cursor` was not produced by `encode`."""
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            sort, descending, value, id_ = json.loads(data.decode("utf-8"))
+            return cls(str(sort), bool(descending), value, int(id_))
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+
+class Page(NamedTuple):
+    """Rows of one page, and the cursor to the next one if there are more rows."""
+
+    rows: list
+    next_cursor: Optional[str]
+
+
+def paginate(
+    query,
+    model,
+    sort_keys: Mapping[str, SortKey],
+    sort: str = "id",
+    descending: bool = False,
+    after: Optional[Cursor] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Page:
+    """Fetch the `limit` rows of `query` following `after` (or the first ones), ordered
+    by `sort_keys[sort]` and then by ID. `after` must be a cursor for the same
+    ordering.
+    """
+
+    key = sort_keys[sort]
+    if sort == "id":
+        columns = (model.id,)
+    else:
+        columns = (key.expression, model.id)
+
+    if after is not None:
+        if sort == "id":
+            row, bound = model.id, after.id
+        else:
+            row, bound = tuple_(*columns), tuple_(key.load(after.value), after.id)
+        query = query.filter(row < bound if descending else row > bound)
+
+    query = query.order_by(
+        *(column.desc() if descending else column.asc() for column in columns)
+    )
+    # One more row than needed tells whether there is a next page.
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows, None)
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, Cursor(sort, descending, key.value(last), last.id).encode())
+
+
+def parse_page_args(
+    args, sort_keys: Mapping[str, SortKey], default_sort: str = "id"
+) -> Tuple[str, bool, Optional[Cursor], int]:
+    """Read `sort` (prefixed with `-` for descending order), `cursor` and `limit` from
+    request arguments. Aborts with a 400 error on invalid values.
+    """
+
+    sort = args.get("sort", default_sort)
+    descending = sort.startswith("-")
+    sort = sort.lstrip("-")
+    if sort not in sort_keys:
+        abort(400, message=f"Cannot sort by {sort}; sort by {', '.join(sort_keys)}.")
+
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        abort(400, message="Parameter limit must be a number.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        abort(400, message=f"Parameter limit must be between 1 and {MAX_PAGE_SIZE}.")
+
+    cursor = args.get("cursor")
+    if cursor is not None:
+        try:
+            cursor = Cursor.decode(cursor)
+            sort_keys[cursor.sort].load(cursor.value)
+        except (KeyError, TypeError, ValueError):
+            abort(400, message="Invalid cursor.")
+        if (cursor.sort, cursor.descending) != (sort, descending):
+            abort(400, message="The cursor was issued for a different sort order.")
+
+    return sort, descending, cursor, limit
+
+
+def paginate_request(
+    query, model, sort_keys: Mapping[str, SortKey], default_sort: str = "id"
+) -> Page:
+    """Paginate `query` as requested by the current request's arguments."""
+    sort, descending, cursor, limit = parse_page_args(
+        request.args, sort_keys, default_sort
+    )
+    return paginate(query, model, sort_keys, sort, descending, cursor, limit)
+
+
+def page_response(page: Page, items: List[Any]):
+    """A response with `items`, linking to the next page in the `Link` header.
+    Aborts with a 404 error if there are no items.
+    """
+
+    if not items:
+        abort(404, message="No match for the current query.")
+
+    headers = {}
+    if page.next_cursor is not None:
+        args = request.args.copy()
+        args["cursor"] = page.next_cursor
+        headers["Link"] = f'<{request.base_url}?{url_encode(args)}>; rel="next"'
+
+    return items, 200, headers
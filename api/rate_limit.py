@@ -0,0 +1,244 @@
+"""Rate limiting of API requests with token buckets, per API key or per IP address.
+
+Each client has a bucket holding up to `capacity` tokens, refilled continuously at
+`rate` tokens per second. A request takes the cost of its endpoint from the bucket,
+expensive endpoints such as `/api/fillin` costing more than listings; when there
+aren't enough tokens left, it is rejected with a `429 Too Many Requests` error and a
+`Retry-After` header. Requests with an API key are limited per key, more generously,
+and other requests per IP address: behind proxies, such as Heroku's router, the address
+is taken from `X-Forwarded-For` by `ProxyFix` (see `TRUSTED_PROXY_COUNT`).
+
+Buckets are kept in an SQLite file shared by all workers of the host, so that a
+client gets the same limit whichever worker serves it.
+"""
+
+import itertools
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from flask import abort, g, request
+from flask_restful.representations.json import output_json
+from werkzeug.exceptions import Unauthorized
+
+from auth import load_credentials
+
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "rate_limits.sqlite3")
+DEFAULT_CAPACITY = 60
+"""Tokens of a client without an API key, i.e. the size of its bursts."""
+DEFAULT_REFILL_RATE = 1.0
+"""Tokens per second given back to a client without an API key."""
+DEFAULT_KEY_CAPACITY = 300
+DEFAULT_KEY_REFILL_RATE = 5.0
+DEFAULT_COSTS = {
+    "/api/fillin": 10,
+    "/api/fillin/stream": 10,
+    "/api/fillin/jobs": 10,
+}
+"""Tokens taken by a request, by URL rule; other endpoints take one."""
+PRUNE_INTERVAL = 1000
+"""Number of requests between two deletions of the buckets which are full again."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    full_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_bucket_full_at ON bucket (full_at);
+"""
+
+
+class Decision(NamedTuple):
+    """Outcome of taking tokens from a bucket."""
+
+    allowed: bool
+    limit: int
+    """Capacity of the bucket."""
+    remaining: float
+    """Tokens left in the bucket."""
+    retry_after: float
+    """Seconds until the request could be allowed, 0 if it was."""
+    reset: float
+    """Seconds until the bucket is full again."""
+
+
+class TokenBuckets:
+    """Token buckets stored in an SQLite file, which can be shared by processes."""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._takes = itertools.count(1)
+
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Transactions are begun explicitly, to take the write lock right away.
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            # Losing the last changes to buckets on a crash is harmless.
+            connection.execute("PRAGMA synchronous = OFF")
+            self._local.connection = connection
+
+        return connection
+
+    def take(self, key: str, cost: float, capacity: int, rate: float) -> Decision:
+        """Take `cost` tokens from the bucket of `key` if it holds enough, creating it
+        full if missing. A cost above the capacity takes the whole bucket.
+        """
+
+        cost = min(cost, capacity)
+        now = time.time()
+        connection = self._connection()
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tokens, updated_at FROM bucket WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                tokens = capacity
+            else:
+                tokens, updated_at = row
+                tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            reset = (capacity - tokens) / rate
+            connection.execute(
+                "INSERT OR REPLACE INTO bucket (key, tokens, updated_at, full_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + reset),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        # Unlike `+=`, `next` on a count is atomic across request threads.
+        if next(self._takes) % PRUNE_INTERVAL == 0:
+            self.prune()
+
+        retry_after = 0.0 if allowed else (cost - tokens) / rate
+        return Decision(allowed, capacity, tokens, retry_after, reset)
+
+    def prune(self):
+        """Delete the buckets which are full again, and so the same as missing ones."""
+        self._connection().execute(
+            "DELETE FROM bucket WHERE full_at <= ?", (time.time(),)
+        )
+
+
+_buckets: Optional[TokenBuckets] = None
+_capacity = DEFAULT_CAPACITY
+_refill_rate = DEFAULT_REFILL_RATE
+_key_capacity = DEFAULT_KEY_CAPACITY
+_key_refill_rate = DEFAULT_KEY_REFILL_RATE
+_costs: Dict[str, float] = dict(DEFAULT_COSTS)
+
+
+def configure(config):
+    """Apply the app's settings: `RATE_LIMIT_ENABLED`, `RATE_LIMIT_PATH`,
+    `RATE_LIMIT_CAPACITY`, `RATE_LIMIT_REFILL_RATE`, `RATE_LIMIT_KEY_CAPACITY`,
+    `RATE_LIMIT_KEY_REFILL_RATE` and `RATE_LIMIT_COSTS`.
+    """
+
+    global _buckets, _capacity, _refill_rate, _key_capacity
+    global _key_refill_rate, _costs
+    _capacity = int(config.get("RATE_LIMIT_CAPACITY", DEFAULT_CAPACITY))
+    _refill_rate = float(config.get("RATE_LIMIT_REFILL_RATE", DEFAULT_REFILL_RATE))
+    _key_capacity = int(config.get("RATE_LIMIT_KEY_CAPACITY", DEFAULT_KEY_CAPACITY))
+    _key_refill_rate = float(
+        config.get("RATE_LIMIT_KEY_REFILL_RATE", DEFAULT_KEY_REFILL_RATE)
+    )
+    _costs = dict(config.get("RATE_LIMIT_COSTS", DEFAULT_COSTS))
+    _buckets = None
+    if config.get("RATE_LIMIT_ENABLED", True):
+        _buckets = TokenBuckets(config.get("RATE_LIMIT_PATH", DEFAULT_PATH))
+
+
+def request_cost() -> float:
+    """Tokens taken by the current request."""
+    rule = request.url_rule.rule if request.url_rule is not None else None
+    return _costs.get(rule, 1)
+
+
+def limit():
+    """Take the cost of the current request from its client's bucket, and abort with
+    a 429 error if there aren't enough tokens left. Only API requests are limited, and
+    not CORS preflight requests. Requests with a valid API key are limited per key;
+    those with an invalid one are charged to their IP address before being rejected by
+    `auth.load_credentials`, so that guessing keys is limited too.
+    """
+
+    g.rate_limit = None
+    if (
+        _buckets is None
+        or request.method == "OPTIONS"
+        or not request.path.startswith("/api/")
+    ):
+        return
+
+    rejected = None
+    try:
+        load_credentials()
+    except Unauthorized as error:
+        rejected = error
+
+    credentials = g.credentials
+    if credentials is not None:
+        key = f"key:{credentials.key_id}"
+        capacity, rate = _key_capacity, _key_refill_rate
+    else:
+        key = f"ip:{request.remote_addr}"
+        capacity, rate = _capacity, _refill_rate
+
+    try:
+        g.rate_limit = _buckets.take(key, request_cost(), capacity, rate)
+    except sqlite3.Error:
+        # Better to serve clients without limits than not to serve them at all.
+        pass
+
+    decision = g.rate_limit
+    if decision is not None and not decision.allowed:
+        message = (
+            f"Too many requests. Retry in {math.ceil(decision.retry_after)} seconds"
+        )
+        if credentials is None:
+            message += ", or use an API key for a higher limit"
+        # Rendered here rather than by Flask-RESTful, which leaves paths outside of
+        #  its resources to Flask's HTML error pages.
+        response = output_json({"message": message + "."}, 429)
+        response.headers["Content-Type"] = "application/json"
+        abort(response)
+
+    if rejected is not None:
+        raise rejected
+
+
+def add_headers(response):
+    """Tell the client about its rate limit, in the `X-RateLimit-*` headers, and when
+    to retry a rejected request, in `Retry-After`.
+    """
+
+    decision = g.get("rate_limit")
+    if decision is None:
+        return response
+
+    response.headers["X-RateLimit-Limit"] = str(decision.limit)
+    response.headers["X-RateLimit-Remaining"] = str(math.floor(decision.remaining))
+    response.headers["X-RateLimit-Reset"] = str(math.ceil(decision.reset))
+    if not decision.allowed:
+        response.headers["Retry-After"] = str(math.ceil(decision.retry_after))
+
+    return response
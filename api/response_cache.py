@@ -0,0 +1,150 @@
+"""Cache of API responses, for listings read much more often than they are written.
+
+Responses are cached per endpoint, path and normalized query string, and served with a
+strong ETag, so that clients sending it back get a `304 Not Modified` without the
+database being queried. Each cached endpoint declares the models its responses are
+made of: once changes to any of them are committed in this process, the endpoint's
+generation is incremented, and responses cached for previous generations are no longer
+served; they are evicted as the least recently used. Changes made by other processes
+are picked up when responses expire, after `RESPONSE_CACHE_TTL` seconds.
+"""
+
+import hashlib
+import itertools
+import threading
+from collections import defaultdict
+from functools import wraps
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from flask import Response, request
+from flask_restful.representations.json import output_json
+from flask_restful.utils import unpack
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from caching import LRUCache
+
+
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024
+"""Maximum size in bytes of the cached responses."""
+DEFAULT_TTL = 60.0
+"""Seconds for which a response is cached."""
+MAX_ENTRIES = 100000
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: List[Tuple[str, str]]
+    etag: str
+
+
+def _weigh(response: CachedResponse) -> int:
+    # Rough overhead of the entry and its headers.
+    return len(response.body) + 512
+
+
+_cache: LRUCache[tuple, CachedResponse] = LRUCache(
+    MAX_ENTRIES, ttl=DEFAULT_TTL, max_weight=DEFAULT_CACHE_SIZE, weigh=_weigh
+)
+_generations: Dict[str, int] = defaultdict(int)
+_dependents: Dict[type, Set[str]] = defaultdict(set)
+"""Names of the cached endpoints depending on each model."""
+_lock = threading.Lock()
+
+
+def configure(config):
+    """Apply the app's settings: `RESPONSE_CACHE_SIZE` and `RESPONSE_CACHE_TTL`."""
+    _cache.max_weight = int(config.get("RESPONSE_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    _cache.ttl = float(config.get("RESPONSE_CACHE_TTL", DEFAULT_TTL))
+
+
+def invalidate(*models: type):
+    """Stop serving the cached responses of the endpoints depending on `models`.
+    Call this after changing their tables without going through the ORM, e.g. with
+    raw SQL statements.
+    """
+
+    with _lock:
+        for name in set().union(*(_dependents.get(model, ()) for model in models)):
+            _generations[name] += 1
+
+
+def normalized_args(args) -> Tuple[Tuple[str, str], ...]:
+    """Query parameters in a canonical order, as the order doesn't change results."""
+    return tuple(sorted(args.items(multi=True)))
+
+
+def cached(name: str, *models: type):
+    """Decorator caching the successful responses of a view to GET requests, until
+    changes to `models` are committed. `name` identifies the endpoint.
+    """
+
+    for model in models:
+        _dependents[model].add(name)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+
+            with _lock:
+                generation = _generations[name]
+            key = (name, generation, request.path, normalized_args(request.args))
+            entry = _cache.get(key)
+            if entry is None:
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response):
+                    # Rendered as Flask-RESTful would, JSON being the only format.
+                    response = output_json(*unpack(response))
+                    response.headers["Content-Type"] = "application/json"
+                if response.status_code != 200:
+                    return response
+
+                body = response.get_data()
+                entry = CachedResponse(
+                    body,
+                    list(response.headers.items()),
+                    hashlib.sha256(body).hexdigest()[:32],
+                )
+                # Keyed by the generation read before the view ran, so that a
+                #  response predating a concurrent commit is never served after it.
+                _cache.set(key, entry)
+
+            response = Response(entry.body, 200, entry.headers)
+            response.set_etag(entry.etag)
+            return response.make_conditional(request)
+
+        return wrapper
+
+    return decorator
+
+
+# Changes are recorded per session and applied once committed, so that responses
+#  cached meanwhile are invalidated too.
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, _flush_context):
+    changed = session.info.setdefault("responses_changed", set())
+    for instance in itertools.chain(session.new, session.dirty, session.deleted):
+        if type(instance) in _dependents:
+            changed.add(type(instance))
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _track_bulk(context):
+    model = context.mapper.class_
+    if model in _dependents:
+        context.session.info.setdefault("responses_changed", set()).add(model)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    changed = session.info.pop("responses_changed", ())
+    if changed:
+        invalidate(*changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("responses_changed", None)
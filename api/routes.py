@@ -1,9 +1,42 @@
 """Define the main routes of the app."""
 
-from flask import Blueprint, request
+from flask import Blueprint, current_app, g, request
 from flask_restful import Resource, abort, Api
 from functools import wraps
+from typing import Callable, List, Optional
+import click
 from flask_jwt import jwt_required, current_identity
+from sqlalchemy.orm import Query
+from werkzeug.urls import url_encode
+from auth import key_required
+from autocomplete import complete_catalog, complete_lemmas
+import hierarchy
+from lemmas import resolve as resolve_lemmas
+from models import (
+    db,
+    Lemma,
+    LemmaType,
+    PermLevel,
+    Review,
+    Tag,
+    ResourceName,
+    ResourceUrl,
+    VoteValue,
+)
+from models import Resource as LearningResource
+from response_cache import cached
+import search
+from pagination import (
+    SortKey,
+    creation_date_key,
+    id_key,
+    page_response,
+    paginate_request,
+)
+from tags import tag_ids
+import serialization
+import vocabulary
+import votes
 
 
 # TODO consider when implementing auth routes: https://tools.ietf.org/html/rfc6750
@@ -13,6 +46,7 @@ routes = Blueprint(
     static_folder="../build",
     static_url_path="/",
     url_prefix="/api/",  # This applies to all resources in this blueprint.
+    cli_group="resources",
 )
 
 api = Api(routes)
@@ -64,7 +98,568 @@ class ParamExample(Resource):
         return {"result": int(add1) + int(add2)}
 
 
+RESOURCE_SORT_KEYS = {
+    "id": id_key(LearningResource),
+    "creation_date": creation_date_key(LearningResource),
+    "votes": SortKey(
+        LearningResource.upvotes - LearningResource.downvotes,
+        lambda resource: resource.upvotes - resource.downvotes,
+        int,
+    ),
+    "rank": SortKey(LearningResource.rank, lambda resource: resource.rank, float),
+}
+LEMMA_SORT_KEYS = {"id": id_key(Lemma), "creation_date": creation_date_key(Lemma)}
+REVIEW_SORT_KEYS = {"id": id_key(Review), "creation_date": creation_date_key(Review)}
+TAG_SORT_KEYS = {"id": id_key(Tag)}
+# Columns read by the sort keys, loaded whichever fields are requested.
+RESOURCE_SORT_COLUMNS = ["creation_date", "upvotes", "downvotes", "rank"]
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+MAX_RESOLVED_LEMMAS = 10000
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+TREE_DEPTH = 8
+MAX_TREE_DEPTH = 32
+MAX_TREE_SIZE = 5000
+VOCABULARY_PAGE_SIZE = 10000
+MAX_VOCABULARY_PAGE_SIZE = 100000
+MAX_VOCABULARY_CHANGES = 10000
+
+
+class Resources(Resource):
+    """Lists learning resources, a page at a time."""
+
+    decorators = [
+        cached("resources", LearningResource, ResourceName, ResourceUrl, Tag)
+    ]
+
+    def get(self):
+        args = request.args
+        query = LearningResource.query
+
+        resource_id = int_arg(args, "resource_id")
+        if resource_id is not None:
+            query = query.filter(LearningResource.id == resource_id)
+        if "name" in args:
+            query = query.filter(
+                LearningResource.names.any(search.matches(ResourceName, args["name"]))
+            )
+        if "includes_tags" in args:
+            names = set(args.getlist("includes_tags"))
+            ids = tag_ids(names)
+            if len(ids) < len(names):
+                # No resource can have a tag that doesn't exist.
+                abort(404, message="No match for the current query.")
+            query = query.filter(LearningResource.tag_ids.contains(list(ids.values())))
+        if "excludes_tags" in args:
+            ids = tag_ids(args.getlist("excludes_tags"))
+            if ids:
+                query = query.filter(
+                    ~LearningResource.tag_ids.overlap(list(ids.values()))
+                )
+        if "has_parent" in args:
+            has_parent = args["has_parent"].lower() in ("1", "true", "yes")
+            query = query.filter(
+                LearningResource.parent_id.isnot(None)
+                if has_parent
+                else LearningResource.parent_id.is_(None)
+            )
+        parent_id = int_arg(args, "parent_id")
+        if parent_id is not None:
+            query = query.filter(LearningResource.parent_id == parent_id)
+
+        fields = serialization.resources.requested(args)
+        query = query.options(
+            *serialization.resources.options(fields, RESOURCE_SORT_COLUMNS)
+        )
+        page = paginate_request(query, LearningResource, RESOURCE_SORT_KEYS)
+        return page_response(
+            page, serialization.resources.serialize_all(page.rows, fields)
+        )
+
+
+class ResourceTree(Resource):
+    """Lists a resource and its relatives up to `depth` levels away, in one query."""
+
+    walk: Callable[[int, int], Query]
+
+    def get(self, resource_id: int):
+        """Returns the resources, each with its `depth` from the requested one, in
+        order of depth and then of ID. Takes `fields` like `Resources`; `parent_id`
+        is always returned, to rebuild the tree.
+        """
+
+        args = request.args
+        depth = int_arg(args, "depth")
+        depth = TREE_DEPTH if depth is None else depth
+        if not 0 <= depth <= MAX_TREE_DEPTH:
+            abort(
+                400, message=f"Parameter depth must be between 0 and {MAX_TREE_DEPTH}."
+            )
+
+        fields = serialization.resources.requested(args)
+        if "parent_id" not in fields:
+            fields = [*fields, "parent_id"]
+        rows = (
+            self.walk(resource_id, depth)
+            .options(*serialization.resources.options(fields))
+            .limit(MAX_TREE_SIZE + 1)
+            .all()
+        )
+        if not rows:
+            abort(404, message="No such resource.")
+        if len(rows) > MAX_TREE_SIZE:
+            abort(
+                400,
+                message=f"More than {MAX_TREE_SIZE} resources; lower the depth.",
+            )
+
+        return [
+            {**serialization.resources.serialize(resource, fields), "depth": depth}
+            for resource, depth in rows
+        ]
+
+
+class ResourceSubtree(ResourceTree):
+    walk = staticmethod(hierarchy.subtree)
+
+
+class ResourceAncestors(ResourceTree):
+    walk = staticmethod(hierarchy.ancestors)
+
+
+class ResourceSearch(Resource):
+    """Lists the resources whose names best match a text."""
+
+    def get(self):
+        """Returns up to `limit` resources having a name matching `q`, the best match
+        first, each with its `relevance`. Takes `fields` like `Resources`.
+        """
+
+        args = request.args
+        text = search_text(args)
+        limit = limit_arg(args, SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+        fields = serialization.resources.requested(args)
+
+        relevance = db.func.max(search.relevance(ResourceName, text))
+        ranked = (
+            db.session.query(
+                ResourceName.resource_id.label("id"), relevance.label("relevance")
+            )
+            .filter(search.matches(ResourceName, text))
+            .group_by(ResourceName.resource_id)
+            .order_by(relevance.desc(), ResourceName.resource_id)
+            .limit(limit)
+            .subquery()
+        )
+        rows = (
+            db.session.query(LearningResource, ranked.c.relevance)
+            .join(ranked, LearningResource.id == ranked.c.id)
+            .options(*serialization.resources.options(fields))
+            .order_by(ranked.c.relevance.desc(), LearningResource.id)
+            .all()
+        )
+        if not rows:
+            abort(404, message="No match for the current query.")
+
+        return [
+            {**serialization.resources.serialize(resource, fields), "relevance": score}
+            for resource, score in rows
+        ]
+
+
+class ResourceVote(Resource):
+    """Casts or retracts the current user's vote of kind `value` on a resource."""
+
+    decorators = [key_required(PermLevel.REVIEW)]
+    value: VoteValue
+
+    def post(self, resource_id: int):
+        counter = votes.get_vote_counter(
+            current_app._get_current_object(), current_app.config
+        )
+        try:
+            voted = votes.cast(counter, g.credentials.user_id, resource_id, self.value)
+        except votes.NoSuchResource:
+            abort(404, message="No such resource.")
+
+        if not voted:
+            abort(409, message="Only one up/downvote per user per resource is allowed.")
+        return None, 204
+
+    def delete(self, resource_id: int):
+        counter = votes.get_vote_counter(
+            current_app._get_current_object(), current_app.config
+        )
+        if not votes.retract(
+            counter, g.credentials.user_id, resource_id, self.value
+        ):
+            abort(404, message="No vote of this kind on this resource by this user.")
+        return None, 204
+
+
+class Upvote(ResourceVote):
+    value = VoteValue.UP
+
+
+class Downvote(ResourceVote):
+    value = VoteValue.DOWN
+
+
+class Lemmas(Resource):
+    """Lists recorded vocabulary, a page at a time."""
+
+    decorators = [cached("lemmas", Lemma)]
+
+    def get(self):
+        args = request.args
+        query = Lemma.query
+
+        lemma_id = int_arg(args, "lemma_id")
+        if lemma_id is not None:
+            query = query.filter(Lemma.id == lemma_id)
+        if "type" in args:
+            types = parse_lemma_types(args.getlist("type"))
+            query = query.filter(Lemma.type_.contains([type_.value for type_ in types]))
+        if "content_is" in args:
+            query = query.filter(Lemma.content == args["content_is"])
+        if "content_like" in args:
+            query = query.filter(
+                Lemma.content.contains(args["content_like"], autoescape=True)
+            )
+
+        fields = serialization.lemmas.requested(args)
+        query = query.options(*serialization.lemmas.options(fields, ["creation_date"]))
+        page = paginate_request(query, Lemma, LEMMA_SORT_KEYS)
+        return page_response(
+            page, serialization.lemmas.serialize_all(page.rows, fields)
+        )
+
+
+class LemmaAutocomplete(Resource):
+    """Completes lemma contents from an in-memory index, without database queries."""
+
+    def get(self):
+        """Usage: /api/lemmas/autocomplete?prefix=加&limit=10"""
+        prefix = request.args.get("prefix", "").strip()
+        if not prefix:
+            abort(400, message="Missing parameter: prefix")
+
+        limit = int_arg(request.args, "limit")
+        limit = AUTOCOMPLETE_LIMIT if limit is None else limit
+        if not 1 <= limit <= MAX_AUTOCOMPLETE_LIMIT:
+            message = f"Parameter limit must be between 1 and {MAX_AUTOCOMPLETE_LIMIT}."
+            abort(400, message=message)
+
+        return [
+            {"content": content, "ids": ids}
+            for content, ids in complete_lemmas(prefix, limit)
+        ]
+
+
+class Autocomplete(Resource):
+    """Completes resource names and tags from an in-memory index, without database
+    queries.
+    """
+
+    def get(self):
+        """Usage: /api/autocomplete?prefix=hany&kind=resource&kind=tag&limit=10"""
+        prefix = request.args.get("prefix", "").strip()
+        if not prefix:
+            abort(400, message="Missing parameter: prefix")
+
+        limit = int_arg(request.args, "limit")
+        limit = AUTOCOMPLETE_LIMIT if limit is None else limit
+        if not 1 <= limit <= MAX_AUTOCOMPLETE_LIMIT:
+            message = f"Parameter limit must be between 1 and {MAX_AUTOCOMPLETE_LIMIT}."
+            abort(400, message=message)
+
+        kinds = request.args.getlist("kind") or None
+        if kinds is not None and not set(kinds) <= {"resource", "tag"}:
+            abort(400, message="Parameter kind must be resource or tag.")
+
+        completions = complete_catalog(prefix, limit, kinds)
+        return [completion._asdict() for completion in completions]
+
+
+class LemmaResolution(Resource):
+    """Resolves many lemma contents to lemma IDs at once."""
+
+    def post(self):
+        """Takes a JSON object with a list of `contents` and, optionally, a list of
+        types the lemmas must have. Returns an object mapping each content to the IDs
+        of the matching lemmas; contents without any are left out.
+        """
+
+        data = request.get_json(silent=True) or {}
+        contents = data.get("contents")
+        if not isinstance(contents, list) or not all(
+            isinstance(content, str) for content in contents
+        ):
+            abort(400, message="Parameter contents must be a list of strings.")
+        if len(contents) > MAX_RESOLVED_LEMMAS:
+            abort(400, message=f"At most {MAX_RESOLVED_LEMMAS} contents at a time.")
+
+        types = data.get("type", [])
+        if not isinstance(types, list):
+            types = [types]
+
+        return resolve_lemmas(contents, parse_lemma_types(types))
+
+
+class Vocabulary(Resource):
+    """Lists the IDs of the lemmas known to the current user, a page at a time."""
+
+    decorators = [key_required()]
+
+    def get(self):
+        """Returns the `count` of known lemmas if `count_only` is set. Otherwise,
+        returns up to `limit` lemma IDs after the ID `after`, in ascending order,
+        packed as base64 little-endian unsigned 32-bit integers in `lemma_ids`; the
+        `Link` header links to the next page, if any.
+        """
+
+        args = request.args
+        user_id = g.credentials.user_id
+        if args.get("count_only", "").lower() in ("1", "true", "yes"):
+            return {"count": vocabulary.count(user_id)}
+
+        after = int_arg(args, "after")
+        limit = limit_arg(args, VOCABULARY_PAGE_SIZE, MAX_VOCABULARY_PAGE_SIZE)
+
+        ids = vocabulary.lemma_ids(user_id, after, limit + 1)
+        headers = {}
+        if len(ids) > limit:
+            ids = ids[:limit]
+            next_args = args.copy()
+            next_args["after"] = ids[-1]
+            next_url = f"{request.base_url}?{url_encode(next_args)}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+
+        return {"count": len(ids), "lemma_ids": vocabulary.pack_ids(ids)}, 200, headers
+
+
+class VocabularyChanges(Resource):
+    """Syncs the current user's vocabulary with a client's copy, by version."""
+
+    decorators = [key_required()]
+
+    def get(self):
+        """Returns the changes made after the version `since` (0 by default): IDs of the
+        lemmas `added` and `removed` since, packed like those of `Vocabulary`, and
+        the `version` to ask for changes since next time. If there are more than
+        `limit` changes, the `Link` header links to the next ones.
+        """
+
+        args = request.args
+        since = int_arg(args, "since") or 0
+        limit = limit_arg(args, VOCABULARY_PAGE_SIZE, MAX_VOCABULARY_PAGE_SIZE)
+
+        changes = vocabulary.changes_since(g.credentials.user_id, since, limit)
+        headers = {}
+        if changes.more:
+            next_args = args.copy()
+            next_args["since"] = changes.version
+            next_url = f"{request.base_url}?{url_encode(next_args)}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+
+        return (
+            {
+                "version": changes.version,
+                "added": vocabulary.pack_ids(changes.added),
+                "removed": vocabulary.pack_ids(changes.removed),
+            },
+            200,
+            headers,
+        )
+
+    @key_required(PermLevel.REVIEW)
+    def post(self):
+        """Takes a JSON object with lists of lemma IDs to `add` to and `remove` from
+        the vocabulary, and applies them at once. IDs of lemmas that don't exist are
+        ignored. Returns the new `version` of the vocabulary.
+        """
+
+        data = request.get_json(silent=True) or {}
+        changes = {}
+        for name in ("add", "remove"):
+            ids = data.get(name, [])
+            # JSON booleans are ints to Python: true would be lemma 1.
+            if not isinstance(ids, list) or not all(
+                type(id_) is int and 0 < id_ < 2 ** 31 for id_ in ids
+            ):
+                abort(400, message=f"Parameter {name} must be a list of lemma IDs.")
+            changes[name] = set(ids)
+
+        if len(changes["add"]) + len(changes["remove"]) > MAX_VOCABULARY_CHANGES:
+            abort(400, message=f"At most {MAX_VOCABULARY_CHANGES} changes at a time.")
+        if changes["add"] & changes["remove"]:
+            abort(400, message="Lemmas cannot be both added and removed.")
+
+        version = vocabulary.apply_changes(
+            g.credentials.user_id, sorted(changes["add"]), sorted(changes["remove"])
+        )
+        return {"version": version}
+
+
+class Reviews(Resource):
+    """Lists published reviews, a page at a time."""
+
+    def get(self):
+        args = request.args
+        query = Review.query
+
+        for name, column in (
+            ("review_id", Review.id),
+            ("resource_id", Review.resource_id),
+            ("user_id", Review.user_id),
+        ):
+            value = int_arg(args, name)
+            if value is not None:
+                query = query.filter(column == value)
+        if "review_content" in args:
+            query = query.filter(search.matches(Review, args["review_content"]))
+
+        fields = serialization.reviews.requested(args)
+        query = query.options(*serialization.reviews.options(fields, ["creation_date"]))
+        page = paginate_request(query, Review, REVIEW_SORT_KEYS)
+        return page_response(
+            page, serialization.reviews.serialize_all(page.rows, fields)
+        )
+
+
+class ReviewSearch(Resource):
+    """Lists the reviews whose contents best match a text."""
+
+    def get(self):
+        """Returns up to `limit` reviews matching `q`, the best match first, each with
+        its `relevance`. Takes `fields` like `Reviews`.
+        """
+
+        args = request.args
+        text = search_text(args)
+        limit = limit_arg(args, SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+        fields = serialization.reviews.requested(args)
+
+        relevance = search.relevance(Review, text)
+        rows = (
+            db.session.query(Review, relevance)
+            .filter(search.matches(Review, text))
+            .options(*serialization.reviews.options(fields))
+            .order_by(relevance.desc(), Review.id)
+            .limit(limit)
+            .all()
+        )
+        if not rows:
+            abort(404, message="No match for the current query.")
+
+        return [
+            {**serialization.reviews.serialize(review, fields), "relevance": score}
+            for review, score in rows
+        ]
+
+
+class Tags(Resource):
+    """Lists resource tags, a page at a time."""
+
+    decorators = [cached("tags", Tag)]
+
+    def get(self):
+        args = request.args
+        query = Tag.query
+
+        tag_id = int_arg(args, "tag_id")
+        if tag_id is not None:
+            query = query.filter(Tag.id == tag_id)
+        if "content_is" in args:
+            query = query.filter(Tag.value == args["content_is"])
+        if "content_like" in args:
+            query = query.filter(
+                Tag.value.contains(args["content_like"], autoescape=True)
+            )
+
+        fields = serialization.tags.requested(args)
+        query = query.options(*serialization.tags.options(fields))
+        page = paginate_request(query, Tag, TAG_SORT_KEYS)
+        return page_response(page, serialization.tags.serialize_all(page.rows, fields))
+
+
+def int_arg(args, name: str) -> Optional[int]:
+    """Read an optional integer from request arguments, aborting if it isn't one."""
+    value = args.get(name)
+    if value is None:
+        return None
+
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, message=f"Parameter {name} must be a number.")
+
+
+def limit_arg(args, default: int, maximum: int) -> int:
+    """Read the optional `limit` from request arguments, aborting unless it is between
+    1 and `maximum`.
+    """
+
+    limit = int_arg(args, "limit")
+    limit = default if limit is None else limit
+    if not 1 <= limit <= maximum:
+        abort(400, message=f"Parameter limit must be between 1 and {maximum}.")
+    return limit
+
+
+def search_text(args) -> str:
+    """Read the text to search for from request arguments, aborting if it has no
+    words.
+    """
+
+    text = args.get("q", "")
+    if not search.query_words(text):
+        abort(400, message="Parameter q must contain words to search for.")
+    return text
+
+
+def parse_lemma_types(names) -> List[LemmaType]:
+    """Read lemma types by name, as in the API, aborting if any is unknown."""
+    try:
+        return [LemmaType[str(name).upper()] for name in names]
+    except KeyError:
+        abort(400, message="Unknown lemma type.")
+
+
 # add resources within Blueprint
 api.add_resource(ComplexExample, "multiply/<int:num>")
 api.add_resource(SimpleExample, "test")
 api.add_resource(ParamExample, "add")
+api.add_resource(Resources, "resources")
+api.add_resource(ResourceSearch, "resources/search")
+api.add_resource(ResourceSubtree, "resources/<int:resource_id>/subtree")
+api.add_resource(ResourceAncestors, "resources/<int:resource_id>/ancestors")
+api.add_resource(Upvote, "<int:resource_id>/upvote")
+api.add_resource(Downvote, "<int:resource_id>/downvote")
+api.add_resource(Lemmas, "lemmas")
+api.add_resource(LemmaAutocomplete, "lemmas/autocomplete")
+api.add_resource(LemmaResolution, "lemmas/resolve")
+api.add_resource(Autocomplete, "autocomplete")
+api.add_resource(Vocabulary, "vocabulary")
+api.add_resource(VocabularyChanges, "vocabulary/changes")
+api.add_resource(Reviews, "reviews")
+api.add_resource(ReviewSearch, "reviews/search")
+api.add_resource(Tags, "tags")
+
+
+@routes.cli.command("reconcile-votes")
+def reconcile_votes():
+    """Recount the votes on every resource and fix the counters that drifted."""
+    click.echo(f"Fixed the vote counters of {votes.reconcile()} resources.")
+
+
+@routes.cli.command("index-search")
+@click.option(
+    "--all", "everything", is_flag=True, help="Reindex rows already indexed too."
+)
+def index_search(everything: bool):
+    """Index review contents and resource names for full-text search."""
+    for model in search.INDEXED:
+        count = search.backfill(model, everything=everything)
+        click.echo(f"Indexed {count} rows of {model.__tablename__}.")
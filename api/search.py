@@ -0,0 +1,120 @@
+"""Full-text search over review contents and resource names, in Chinese or not.
+
+PostgreSQL's parser cannot split Chinese text into words, so texts are segmented with
+jieba when written, and the words are stored as a tsvector in the `search_vector`
+column of their row, with a GIN index. Queries are segmented the same way and matched
+against the index, so that searching takes about as long whatever the number of rows.
+Rows written without going through the ORM must be indexed with `backfill`.
+"""
+
+from typing import Dict, List, Type
+
+import jieba
+from sqlalchemy import event, inspect
+from sqlalchemy.sql import ColumnElement, func, text
+
+from models import db, ResourceName, Review
+
+
+CONFIG = "simple"
+"""Text search configuration: words are only lowercased, without stemming."""
+
+INDEXED: Dict[Type[db.Model], str] = {Review: "content", ResourceName: "value"}
+"""Models whose `search_vector` is made of a column, by name."""
+
+
+def index_words(text: str) -> List[str]:
+    """Words under which a text is indexed, in order.
+    Search mode also yields the shorter words inside long ones, so that a query is
+    matched even when jieba segments the text around it differently; the characters
+    of each word are yielded after it too, as queries may be segmented down to a
+    single character which search mode leaves inside a word (好 in 好看).
+    """
+
+    words = []
+    for word in jieba.cut_for_search(text):
+        if word.strip():
+            words.append(word)
+            if len(word) > 1:
+                words.extend(char for char in word if char.strip())
+
+    return words
+
+
+def query_words(text: str) -> List[str]:
+    """Words which must all be in an indexed text for it to match `text`."""
+    return [word for word in jieba.cut(text, cut_all=False) if word.strip()]
+
+
+def document(text: str) -> ColumnElement:
+    """The tsvector to store for a text."""
+    return func.to_tsvector(CONFIG, " ".join(index_words(text)))
+
+
+def query(text: str) -> ColumnElement:
+    """The tsquery matching the texts containing all the words of `text`."""
+    return func.plainto_tsquery(CONFIG, " ".join(query_words(text)))
+
+
+def matches(model, text: str) -> ColumnElement:
+    """Filter on the rows of an indexed model whose text matches `text`."""
+    return model.search_vector.op("@@")(query(text))
+
+
+def relevance(model, text: str) -> ColumnElement:
+    """How well the rows of an indexed model match `text`, the higher the better;
+    words of the query found close to each other count more.
+    """
+
+    return func.ts_rank_cd(model.search_vector, query(text))
+
+
+def backfill(model, batch_size: int = 1000, everything: bool = False) -> int:
+    """Index the rows of a model which are not indexed yet, or all of them if
+    `everything`, committing every `batch_size` rows. Returns the number of rows
+    indexed.
+    """
+
+    table = model.__table__
+    column = table.c[INDEXED[model]]
+    # Not an ORM or Core update, which would set `modified_date` on reviews.
+    update = text(
+        f"UPDATE {table.name} SET search_vector = to_tsvector('{CONFIG}', :words) "
+        "WHERE id = :row_id"
+    )
+
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(table.c.id, column).filter(table.c.id > last_id)
+        if not everything:
+            rows = rows.filter(table.c.search_vector.is_(None))
+        rows = rows.order_by(table.c.id).limit(batch_size).all()
+        if not rows:
+            return indexed
+
+        db.session.execute(
+            update,
+            [
+                {"row_id": row_id, "words": " ".join(index_words(value))}
+                for row_id, value in rows
+            ],
+        )
+        db.session.commit()
+        indexed += len(rows)
+        last_id = rows[-1][0]
+
+
+def _index_on_write(model, column: str):
+    @event.listens_for(model, "before_insert")
+    def index_inserted(_mapper, _connection, target):
+        target.search_vector = document(getattr(target, column))
+
+    @event.listens_for(model, "before_update")
+    def index_updated(_mapper, _connection, target):
+        if inspect(target).attrs[column].history.has_changes():
+            target.search_vector = document(getattr(target, column))
+
+
+for _model, _column in INDEXED.items():
+    _index_on_write(_model, _column)
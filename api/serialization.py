@@ -0,0 +1,176 @@
+"""Serialization of models for the API, loading only what is serialized.
+
+Clients may ask for a subset of the fields of a model with the `fields` parameter.
+Each field declares the columns and relationships it reads, so that a listing loads
+only those: columns through `load_only`, and relationships with one extra query per
+relationship for the whole page (`selectinload`) rather than one per row. Serializing
+a page therefore takes a fixed number of queries, whatever its size.
+"""
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from flask_restful import abort
+from sqlalchemy.orm import load_only, selectinload
+
+from models import Lemma, LemmaType, Resource, Review, Tag
+
+
+class Field(NamedTuple):
+    """A serialized field: how to read it from an instance, the columns it reads, and
+    the relationships it reads, to be loaded with the instance.
+    """
+
+    get: Callable[[Any], Any]
+    columns: Tuple[str, ...] = ()
+    relationships: Tuple[Any, ...] = ()
+
+
+def column(name: str, convert: Optional[Callable[[Any], Any]] = None) -> Field:
+    """Field with the value of a column, converted with `convert` unless it's None."""
+    if convert is None:
+        return Field(lambda instance: getattr(instance, name), (name,))
+
+    def get(instance):
+        value = getattr(instance, name)
+        return convert(value) if value is not None else None
+
+    return Field(get, (name,))
+
+
+def values_of(relationship, attribute: str = "value") -> Field:
+    """Field with the list of `attribute` of each instance of a relationship."""
+    name = relationship.key
+    return Field(
+        lambda instance: [getattr(item, attribute) for item in getattr(instance, name)],
+        relationships=(relationship,),
+    )
+
+
+def serialize_date(date) -> str:
+    return date.isoformat()
+
+
+class Serializer:
+    """Serializes instances of a model to dicts of the requested fields."""
+
+    def __init__(
+        self,
+        model,
+        fields: Mapping[str, Field],
+        default: Optional[Sequence[str]] = None,
+    ):
+        self.model = model
+        self.fields = dict(fields)
+        self.default = list(default if default is not None else fields)
+
+    def requested(self, args) -> List[str]:
+        """Read the fields requested in the comma-separated `fields` parameter, or the
+        default fields. Aborts with a 400 error on unknown fields.
+        """
+
+        if "fields" not in args:
+            return self.default
+
+        names = [name.strip() for name in args["fields"].split(",") if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown or not names:
+            abort(
+                400,
+                message=f"Unknown fields: {', '.join(unknown)}; "
+                f"choose among {', '.join(self.fields)}.",
+            )
+
+        return names
+
+    def options(
+        self, names: Iterable[str], columns: Iterable[str] = (), strategy=selectinload
+    ) -> list:
+        """Loader options for a query whose results are serialized with `names`.
+        `columns` are loaded as well, e.g. to sort or paginate by them; relationships
+        are loaded with `strategy`, `selectinload` by default.
+        """
+
+        needed = {"id", *columns}
+        relationships = {}
+        for name in names:
+            field = self.fields[name]
+            needed.update(field.columns)
+            for relationship in field.relationships:
+                relationships[relationship.key] = relationship
+
+        return [
+            load_only(*sorted(needed)),
+            *(strategy(relationship) for relationship in relationships.values()),
+        ]
+
+    def serialize(self, instance, names: Iterable[str]) -> Dict[str, Any]:
+        return {name: self.fields[name].get(instance) for name in names}
+
+    def serialize_all(self, instances, names: Sequence[str]) -> List[Dict[str, Any]]:
+        return [self.serialize(instance, names) for instance in instances]
+
+
+resources = Serializer(
+    Resource,
+    {
+        "id": column("id"),
+        "creation_date": column("creation_date", serialize_date),
+        "upvotes": column("upvotes"),
+        "downvotes": column("downvotes"),
+        "rank": column("rank"),
+        "names": values_of(Resource.names),
+        "urls": values_of(Resource.urls),
+        "tags": values_of(Resource.tags),
+        "parent_id": column("parent_id"),
+        "children": values_of(Resource.children, "id"),
+    },
+    default=[
+        "id",
+        "creation_date",
+        "upvotes",
+        "downvotes",
+        "names",
+        "urls",
+        "tags",
+        "parent_id",
+    ],
+)
+
+lemmas = Serializer(
+    Lemma,
+    {
+        "id": column("id"),
+        "content": column("content"),
+        "lemma_type": Field(
+            lambda lemma: [
+                LemmaType(value).name.lower() for value in lemma.type_ or []
+            ],
+            ("type_",),
+        ),
+    },
+)
+
+reviews = Serializer(
+    Review,
+    {
+        "id": column("id"),
+        "creation_date": column("creation_date", serialize_date),
+        "modified_date": column("modified_date", serialize_date),
+        "content": column("content"),
+        "resource_id": column("resource_id"),
+        "user_id": column("user_id"),
+    },
+)
+
+tags = Serializer(Tag, {"id": column("id"), "value": column("value")})
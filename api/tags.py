@@ -0,0 +1,75 @@
+"""Resolution of tag names to IDs, as used to filter resources by tag.
+
+Resources carry the IDs of their tags in `Resource.tag_ids`, so tag filters are given
+as IDs; the IDs of tag names are kept in an LRU cache until tags are renamed or
+deleted in this process, or for at most `TAG_CACHE_TTL` seconds, after which changes
+made by other processes are picked up.
+"""
+
+from typing import Dict, Iterable, List
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from caching import LRUCache
+from models import db, Tag
+
+
+DEFAULT_CACHE_SIZE = 4096
+"""Number of tag names whose ID is kept in memory."""
+DEFAULT_CACHE_TTL = 60.0
+"""Seconds for which the ID of a tag name is kept in memory."""
+
+_cache: LRUCache[str, int] = LRUCache(DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL)
+
+
+def configure(config):
+    """Apply the app's settings: `TAG_CACHE_SIZE` and `TAG_CACHE_TTL`."""
+    _cache.max_size = int(config.get("TAG_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    _cache.ttl = float(config.get("TAG_CACHE_TTL", DEFAULT_CACHE_TTL))
+
+
+def _load(names: List[str]) -> Dict[str, int]:
+    return dict(
+        db.session.query(Tag.value, Tag.id).filter(Tag.value.in_(names)).all()
+    )
+
+
+def tag_ids(names: Iterable[str]) -> Dict[str, int]:
+    """Map tag names to their IDs, with a single query for those not cached.
+    Names of tags which don't exist are left out.
+    """
+
+    return _cache.get_many_or_load(set(names), _load)
+
+
+def invalidate():
+    """Forget all cached tag IDs.
+    Call this after renaming or deleting tags without going through the `Tag` model.
+    """
+
+    _cache.clear()
+
+
+# As for vocabularies, changes are applied once committed, so that a concurrent load
+#  cannot cache an ID as it was before the commit. New tags need no invalidation, as
+#  names are only cached once they exist.
+@event.listens_for(Tag, "after_update")
+@event.listens_for(Tag, "after_delete")
+def _track_change(_mapper, _connection, tag):
+    session = object_session(tag)
+    if session is not None:
+        session.info["tags_changed"] = True
+    else:
+        invalidate()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    if session.info.pop("tags_changed", False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("tags_changed", None)
@@ -0,0 +1,79 @@
+"""Shared fixtures. Tests run from the `api` directory: `python -m pytest`.
+
+Tests of endpoints need a PostgreSQL database, named by the `TEST_DATABASE_URL`
+environment variable, and are skipped without it. The database is wiped and migrated
+at the start of the session, so never point it at a database holding real data.
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+from sqlalchemy import event
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+
+@pytest.fixture(scope="session")
+def app():
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set.")
+
+    from flask_migrate import upgrade
+    from init import create_app
+    from models import db
+
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": url,
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            "RATE_LIMIT_ENABLED": False,
+            "RESPONSE_CACHE_SIZE": 0,
+            "TRUSTED_PROXY_COUNT": 0,
+        }
+    )
+    with app.app_context():
+        db.session.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+        db.session.commit()
+        upgrade(directory=os.path.join(API_DIR, "migrations"))
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    return app.test_client()
+
+
+class QueryCounter:
+    """Counts the statements sent to the database by the current thread, leaving out
+    those of background threads such as the rebuilds of autocomplete indexes.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self._thread = threading.get_ident()
+
+    def _count(self, *_args):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *_exc):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+@pytest.fixture
+def count_queries(app):
+    from models import db
+
+    return QueryCounter(db.engine)
@@ -0,0 +1,44 @@
+from autocomplete import PrefixTrie
+
+
+def test_completes_shortest_first_then_in_code_point_order():
+    trie = PrefixTrie()
+    entries = [("加油", 1), ("加", 2), ("加入", 3), ("加油站", 4), ("你", 5)]
+    for key, value in entries:
+        trie.add(key, value)
+
+    assert trie.complete("加") == [
+        ("加", frozenset({2})),
+        ("加入", frozenset({3})),
+        ("加油", frozenset({1})),
+        ("加油站", frozenset({4})),
+    ]
+    assert trie.complete("加", limit=2) == [
+        ("加", frozenset({2})),
+        ("加入", frozenset({3})),
+    ]
+    assert trie.complete("好") == []
+
+
+def test_maps_keys_to_sets_of_values():
+    trie = PrefixTrie()
+    trie.add("行", 1)
+    trie.add("行", 2)
+
+    assert len(trie) == 1
+    assert trie.complete("行") == [("行", frozenset({1, 2}))]
+
+
+def test_discard_prunes_empty_branches():
+    trie = PrefixTrie()
+    trie.add("加油", 1)
+    trie.add("加", 2)
+
+    trie.discard("加油", 1)
+    assert len(trie) == 1
+    assert trie.complete("加") == [("加", frozenset({2}))]
+    assert "油" not in trie._root.children["加"].children
+
+    trie.discard("加", 3)
+    trie.discard("不在", 1)
+    assert len(trie) == 1
@@ -0,0 +1,28 @@
+from exercises.blanking import BLANK, Blanker, blanker_for
+
+
+def test_blanks_every_occurrence_and_reports_positions():
+    blanked = Blanker(["喜欢"]).blank("我喜欢你，你喜欢我")
+
+    assert blanked.text == f"我{BLANK * 2}你，你{BLANK * 2}我"
+    assert blanked.blanks == [(1, 7), (10, 16)]
+    for start, end in blanked.blanks:
+        assert blanked.text[start:end] == BLANK * 2
+
+
+def test_blanks_the_longest_of_overlapping_patterns():
+    blanked = Blanker(["喜欢", "喜欢你"]).blank("我喜欢你")
+
+    assert blanked.text == f"我{BLANK * 3}"
+    assert blanked.blanks == [(1, 10)]
+
+
+def test_without_patterns_leaves_sentences_as_they_are():
+    assert Blanker(["", ""]).blank("我喜欢你") == ("我喜欢你", [])
+
+
+def test_blanks_the_words_of_a_phrase_apart():
+    blanker = blanker_for("学习中文")
+
+    assert blanker.blank("学习中文").blanks == [(0, 12)]
+    assert len(blanker.blank("中文很难学习").blanks) == 2
@@ -0,0 +1,96 @@
+import pytest
+
+import caching
+from caching import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_expires_entries(clock):
+    cache = LRUCache(ttl=10)
+    cache.set("a", 1)
+
+    clock[0] += 9
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_evicts_by_weight():
+    cache = LRUCache(max_weight=10, weigh=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.set("c", "xxxx")
+
+    assert cache.get("a") is None
+    assert cache.weight == 8
+
+    cache.pop("b")
+    assert cache.weight == 4
+
+
+def test_counts_hits_and_misses():
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_get_or_load_caches_loaded_values():
+    cache = LRUCache()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return 42
+
+    assert cache.get_or_load("a", load) == 42
+    assert cache.get_or_load("a", load) == 42
+    assert len(loads) == 1
+
+
+def test_get_or_load_does_not_cache_values_racing_invalidations():
+    cache = LRUCache()
+
+    def load():
+        cache.clear()
+        return 42
+
+    assert cache.get_or_load("a", load) == 42
+    assert cache.get("a") is None
+
+
+def test_get_many_or_load_loads_missing_keys_at_once():
+    cache = LRUCache()
+    cache.set(1, "one")
+    calls = []
+
+    def load(keys):
+        calls.append(keys)
+        return {key: str(key) for key in keys if key != 3}
+
+    assert cache.get_many_or_load([1, 2, 3], load) == {1: "one", 2: "2"}
+    assert calls == [[2, 3]]
+    assert cache.get(2) == "2"
+    assert cache.get(3) is None
@@ -0,0 +1,20 @@
+import pytest
+
+from pagination import Cursor
+
+
+def test_cursors_round_trip():
+    cursor = Cursor("creation_date", True, "2020-07-01T12:00:00", 42)
+    encoded = cursor.encode()
+
+    assert "=" not in encoded
+    assert Cursor.decode(encoded) == cursor
+
+
+@pytest.mark.parametrize(
+    "encoded",
+    ["", "not a cursor", Cursor("id", False, 1, 2).encode()[:-2], "WzEsMl0"],
+)
+def test_rejects_invalid_cursors(encoded):
+    with pytest.raises(ValueError):
+        Cursor.decode(encoded)
@@ -0,0 +1,82 @@
+"""Listings must take a fixed number of queries whatever the size of their pages,
+rather than one more per row for each relationship serialized.
+"""
+
+import pytest
+
+from models import (
+    db,
+    Lemma,
+    LemmaType,
+    Resource,
+    ResourceName,
+    ResourceUrl,
+    Review,
+    Tag,
+    User,
+)
+
+
+ROWS = 30
+
+
+@pytest.fixture(scope="module")
+def seeded(app):
+    tags = [Tag(value=f"tag-{i}") for i in range(5)]
+    user = User(email="reader@example.com", password="password", salt="salt")
+    resources = []
+    for i in range(ROWS):
+        resources.append(
+            Resource(
+                names=[
+                    ResourceName(value=f"资源 {i}"),
+                    ResourceName(value=f"resource {i}"),
+                ],
+                urls=[ResourceUrl(value=f"https://example.com/{i}")],
+                tags=[tags[i % 5], tags[(i + 1) % 5]],
+                # Trees of three resources.
+                parent=resources[i - i % 3] if i % 3 else None,
+            )
+        )
+    db.session.add_all([user, *resources])
+    db.session.flush()
+
+    db.session.add_all(
+        Review(content=f"很好看的书 {i}", resource_id=resource.id, user_id=user.id)
+        for i, resource in enumerate(resources)
+    )
+    db.session.add_all(
+        Lemma(content=f"词{i}", type_=[LemmaType.NOUN.value, LemmaType.VERB.value])
+        for i in range(ROWS)
+    )
+    db.session.commit()
+
+
+def queries(client, count_queries, url: str) -> int:
+    with count_queries as counter:
+        response = client.get(url)
+
+    assert response.status_code == 200, response.get_json()
+    return counter.count
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/api/resources?",
+        "/api/resources?fields=id,names,urls,tags,children&",
+        "/api/resources?includes_tags=tag-1&sort=-rank&",
+        "/api/lemmas?",
+        "/api/reviews?",
+        "/api/reviews?review_content=好看&",
+        "/api/tags?",
+    ],
+)
+def test_listings_take_a_fixed_number_of_queries(client, count_queries, seeded, url):
+    # Fills the caches of the first requests, e.g. of tag IDs.
+    client.get(url + "limit=1")
+
+    small_page = queries(client, count_queries, url + "limit=2")
+    large_page = queries(client, count_queries, url + f"limit={ROWS}")
+
+    assert small_page == large_page
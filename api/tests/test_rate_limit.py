@@ -0,0 +1,64 @@
+import pytest
+from flask import Flask, g
+from werkzeug.exceptions import Unauthorized
+
+import auth
+import rate_limit
+from rate_limit import TokenBuckets
+
+
+@pytest.fixture
+def buckets(tmp_path):
+    return TokenBuckets(str(tmp_path / "rate_limits.sqlite3"))
+
+
+def test_rejects_requests_once_the_bucket_is_empty(buckets):
+    decisions = [buckets.take("ip:1", 1, capacity=3, rate=0.01) for _ in range(4)]
+
+    assert [decision.allowed for decision in decisions] == [True, True, True, False]
+    assert decisions[2].remaining == pytest.approx(0, abs=0.01)
+    assert decisions[3].retry_after == pytest.approx(100, rel=0.01)
+    assert decisions[3].limit == 3
+
+
+def test_limits_clients_separately(buckets):
+    buckets.take("ip:1", 3, capacity=3, rate=0.01)
+
+    assert not buckets.take("ip:1", 1, capacity=3, rate=0.01).allowed
+    assert buckets.take("ip:2", 1, capacity=3, rate=0.01).allowed
+
+
+def test_caps_costs_at_the_capacity(buckets):
+    assert buckets.take("ip:1", 10, capacity=3, rate=0.01).allowed
+    assert not buckets.take("ip:1", 1, capacity=3, rate=0.01).allowed
+
+
+def test_shares_buckets_between_instances(buckets):
+    buckets.take("ip:1", 3, capacity=3, rate=0.01)
+
+    assert not TokenBuckets(buckets.path).take("ip:1", 1, 3, 0.01).allowed
+
+
+def test_prune_only_deletes_full_buckets(buckets):
+    buckets.take("ip:1", 1, capacity=3, rate=1e6)
+    buckets.take("ip:2", 1, capacity=3, rate=0.01)
+    buckets.prune()
+
+    keys = buckets._connection().execute("SELECT key FROM bucket").fetchall()
+    assert keys == [("ip:2",)]
+
+
+def test_charges_requests_with_an_invalid_key_before_rejecting_them(
+    buckets, monkeypatch
+):
+    monkeypatch.setattr(rate_limit, "_buckets", buckets)
+    monkeypatch.setattr(auth, "verify", lambda key: None)
+    app = Flask(__name__)
+    headers = {"Authorization": "Bearer guessed"}
+
+    for remaining in (59, 58):
+        with app.test_request_context("/api/tags", headers=headers):
+            with pytest.raises(Unauthorized):
+                rate_limit.limit()
+
+            assert g.rate_limit.remaining == pytest.approx(remaining, abs=0.1)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from exercises.scoring import coverage, encode, select
+
+
+def test_coverage_is_the_share_of_known_tokens():
+    batch = encode([["我", "喜欢", "你"], [], ["他", "喜欢"], ["你"]])
+
+    assert coverage(batch, {"我", "你"}) == pytest.approx([2 / 3, 0, 0, 1])
+    assert len(coverage(encode([]), {"我"})) == 0
+
+
+def test_selects_the_best_scores_within_the_limit():
+    scores = np.array([0.5, 0.9, 0.7, 0.95, 0.8])
+
+    assert select(scores, 2, 0.75) == [3, 1]
+    assert select(scores, 10, 0.75) == [3, 1, 4]
+
+
+def test_falls_back_to_the_best_score():
+    scores = np.array([0.2, 0.4, 0.3])
+
+    assert select(scores, 2, 0.9) == [1]
+    assert select(scores, 2, 0.9, fallback=False) == []
+
+
+def test_selects_nothing_from_nothing():
+    assert select(np.array([]), 2, 0.5) == []
+    assert select(np.array([0.9]), 0, 0.5) == []
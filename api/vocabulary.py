@@ -0,0 +1,237 @@
+"""Known vocabulary of users, as used to score exercises.
+
+A user's vocabulary is read from `lemmas_to_users_mtm` once and kept in an LRU cache
+until the user's lemmas change in this process, or for at most `VOCABULARY_CACHE_TTL`
+seconds, after which changes made by other processes are picked up. `User.lemmas` is
+not loaded with users: read vocabularies with the functions below, which only select
+lemma IDs.
+
+Clients keep a copy of their vocabulary in sync through versions: a trigger logs each
+change to `lemmas_to_users_mtm` in `vocabulary_change`, one row per user and lemma
+holding the latest change and its version, so that clients fetch only the changes
+since the version they last saw.
+"""
+
+import base64
+import os
+import struct
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.sql import text
+
+from caching import LRUCache
+from models import db, lemmas_helper, Lemma, User, VocabularyChange
+
+
+SAMPLE_VOCABULARY_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "exercises", "sample_vocabulary.txt"
+)
+DEFAULT_CACHE_SIZE = 1024
+"""Number of users whose vocabulary is kept in memory."""
+DEFAULT_CACHE_TTL = 60.0
+"""Seconds for which the vocabulary of a user is kept in memory."""
+
+LOCK_USER = text('SELECT 1 FROM "user" WHERE id = :user_id FOR UPDATE')
+ADD_LEMMAS = text(
+    """
+    INSERT INTO lemmas_to_users_mtm (user_id, lemma_id)
+    SELECT :user_id, id FROM lemma WHERE id = ANY(CAST(:ids AS integer[]))
+    ORDER BY id
+    ON CONFLICT DO NOTHING
+    """
+)
+REMOVE_LEMMAS = text(
+    """
+    DELETE FROM lemmas_to_users_mtm
+    WHERE user_id = :user_id AND lemma_id = ANY(CAST(:ids AS integer[]))
+    """
+)
+
+PUNCTUATION = frozenset(["。", "，", "：", "；", "-", "？", "！", " ", "_", "'", '"'])
+"""Punctuation counts as known, so that it doesn't lower the score of a sentence."""
+
+
+class KnownVocabulary(NamedTuple):
+    """The lemmas known to a user, by id and by content."""
+
+    ids: FrozenSet[int]
+    words: FrozenSet[str]
+
+
+_cache: LRUCache[int, KnownVocabulary] = LRUCache(
+    DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL
+)
+
+
+def configure(config):
+    """Apply the app's settings: `VOCABULARY_CACHE_SIZE` and `VOCABULARY_CACHE_TTL`."""
+    _cache.max_size = int(config.get("VOCABULARY_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    _cache.ttl = float(config.get("VOCABULARY_CACHE_TTL", DEFAULT_CACHE_TTL))
+
+
+def _load(user_id: int) -> KnownVocabulary:
+    rows = (
+        db.session.query(Lemma.id, Lemma.content)
+        .join(lemmas_helper, lemmas_helper.c.lemma_id == Lemma.id)
+        .filter(lemmas_helper.c.user_id == user_id)
+        .all()
+    )
+
+    return KnownVocabulary(
+        ids=frozenset(lemma_id for lemma_id, _ in rows),
+        words=frozenset(content for _, content in rows) | PUNCTUATION,
+    )
+
+
+def known_vocabulary(user_id: int) -> KnownVocabulary:
+    """Return the vocabulary of a user, loading it from the database if not cached."""
+    return _cache.get_or_load(user_id, lambda: _load(user_id))
+
+
+def lemma_ids(
+    user_id: int, after: Optional[int] = None, limit: Optional[int] = None
+) -> List[int]:
+    """IDs of the lemmas known to a user in ascending order, starting after the ID
+    `after` if given, and up to `limit` of them.
+    """
+
+    query = db.session.query(lemmas_helper.c.lemma_id).filter(
+        lemmas_helper.c.user_id == user_id
+    )
+    if after is not None:
+        query = query.filter(lemmas_helper.c.lemma_id > after)
+    query = query.order_by(lemmas_helper.c.lemma_id).limit(limit)
+
+    return [lemma_id for lemma_id, in query]
+
+
+def count(user_id: int) -> int:
+    """Number of lemmas known to a user."""
+    return (
+        db.session.query(db.func.count())
+        .select_from(lemmas_helper)
+        .filter(lemmas_helper.c.user_id == user_id)
+        .scalar()
+    )
+
+
+def pack_ids(ids: Sequence[int]) -> str:
+    """Pack IDs as little-endian unsigned 32-bit integers, encoded in base64: about
+    5.3 characters per ID, against up to 11 for a JSON array.
+    """
+
+    return base64.b64encode(struct.pack(f"<{len(ids)}I", *ids)).decode("ascii")
+
+
+class Changes(NamedTuple):
+    """Changes to a vocabulary up to `version`: lemma IDs added and removed, and
+    whether there are changes after `version`.
+    """
+
+    version: int
+    added: List[int]
+    removed: List[int]
+    more: bool
+
+
+def version(user_id: int) -> int:
+    """The version of a user's vocabulary: that of its latest change, or 0."""
+    return (
+        db.session.query(db.func.coalesce(db.func.max(VocabularyChange.version), 0))
+        .filter(VocabularyChange.user_id == user_id)
+        .scalar()
+    )
+
+
+def changes_since(user_id: int, since: int, limit: Optional[int] = None) -> Changes:
+    """The latest change to each lemma of a user's vocabulary changed after the version
+    `since`, in the order they were made, up to `limit` of them.
+    """
+
+    query = (
+        db.session.query(
+            VocabularyChange.version, VocabularyChange.lemma_id, VocabularyChange.known
+        )
+        .filter(VocabularyChange.user_id == user_id, VocabularyChange.version > since)
+        .order_by(VocabularyChange.version)
+    )
+    rows = query.limit(limit + 1 if limit is not None else None).all()
+    more = limit is not None and len(rows) > limit
+    if more:
+        rows = rows[:limit]
+
+    return Changes(
+        version=rows[-1][0] if rows else since,
+        added=sorted(lemma_id for _, lemma_id, known in rows if known),
+        removed=sorted(lemma_id for _, lemma_id, known in rows if not known),
+        more=more,
+    )
+
+
+def apply_changes(user_id: int, added: Sequence[int], removed: Sequence[int]) -> int:
+    """Add lemmas to and remove lemmas from a user's vocabulary, in one set-based
+    statement each, and commit. IDs of lemmas that don't exist are ignored, as are
+    lemmas already known or not known. Returns the new version of the vocabulary.
+    """
+
+    # Changes to the same vocabulary are serialized, so that their versions follow
+    #  the order they were committed in and a client never skips one.
+    db.session.execute(LOCK_USER, {"user_id": user_id})
+    if removed:
+        db.session.execute(REMOVE_LEMMAS, {"user_id": user_id, "ids": list(removed)})
+    if added:
+        db.session.execute(ADD_LEMMAS, {"user_id": user_id, "ids": list(added)})
+    db.session.info.setdefault("vocabulary_changed", set()).add(user_id)
+    new_version = version(user_id)
+    db.session.commit()
+
+    return new_version
+
+
+@lru_cache(maxsize=None)
+def sample_vocabulary() -> KnownVocabulary:
+    """An example vocabulary, for callers which are not scored against a user's."""
+    with open(SAMPLE_VOCABULARY_PATH, encoding="utf-8") as file:
+        words = frozenset(line.strip() for line in file if line.strip())
+
+    return KnownVocabulary(ids=frozenset(), words=words | PUNCTUATION)
+
+
+def invalidate(user_ids: Iterable[Optional[int]]):
+    """Forget the cached vocabulary of the given users.
+    Call this after changing `lemmas_to_users_mtm` without going through `User.lemmas`.
+    """
+
+    for user_id in user_ids:
+        if user_id is not None:
+            _cache.pop(user_id)
+
+
+# Changes through the ORM are tracked per session and applied once committed, so that
+#  a concurrent load cannot cache the vocabulary as it was before the commit.
+@event.listens_for(User.lemmas, "append")
+@event.listens_for(User.lemmas, "remove")
+def _track_change(user, _lemma, _initiator):
+    session = object_session(user)
+    if session is not None:
+        session.info.setdefault("vocabulary_changed", set()).add(user.id)
+    else:
+        invalidate([user.id])
+
+
+@event.listens_for(User.lemmas, "bulk_replace")
+def _track_replace(user, _values, _initiator):
+    _track_change(user, None, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    invalidate(session.info.pop("vocabulary_changed", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("vocabulary_changed", None)
@@ -0,0 +1,235 @@
+"""Votes on learning resources.
+
+Each vote is a row of the `vote` table keyed by user and resource, so that voting twice
+is rejected instead of counted twice. The `upvotes` and `downvotes` counters of
+resources are not updated by each vote: changes are summed up per resource in memory
+and added to the counters by a background flusher, one statement per batch, so that
+votes on a popular resource don't queue up on a lock of its row. The flusher also
+updates the `rank` of resources, which depends on their counters.
+"""
+
+import atexit
+import threading
+from collections import defaultdict
+from typing import Dict, List, Mapping, Optional
+
+from flask import Flask
+from sqlalchemy.sql import text
+
+from models import db, Resource, VoteValue
+import response_cache
+
+
+DEFAULT_FLUSH_INTERVAL = 2.0
+"""Seconds between two flushes of the vote counters."""
+
+INSERT_VOTE = text(
+    """
+    INSERT INTO vote (user_id, resource_id, value)
+    SELECT :user_id, id, :value FROM resource WHERE id = :resource_id
+    ON CONFLICT (user_id, resource_id) DO NOTHING
+    RETURNING resource_id
+    """
+)
+DELETE_VOTE = text(
+    """
+    DELETE FROM vote
+    WHERE user_id = :user_id AND resource_id = :resource_id AND value = :value
+    RETURNING resource_id
+    """
+)
+INCREMENT_COUNTERS = text(
+    """
+    UPDATE resource
+    SET upvotes = resource.upvotes + delta.up,
+        downvotes = resource.downvotes + delta.down,
+        rank = wilson_lower_bound(
+            resource.upvotes + delta.up, resource.downvotes + delta.down
+        )
+    FROM (
+        SELECT unnest(CAST(:ids AS integer[])) AS id,
+               unnest(CAST(:ups AS integer[])) AS up,
+               unnest(CAST(:downs AS integer[])) AS down
+    ) AS delta
+    WHERE resource.id = delta.id
+    """
+)
+RECONCILE_COUNTERS = text(
+    """
+    UPDATE resource
+    SET upvotes = counts.up,
+        downvotes = counts.down,
+        rank = wilson_lower_bound(counts.up, counts.down)
+    FROM (
+        SELECT resource.id,
+               COUNT(vote.value) FILTER (WHERE vote.value > 0) AS up,
+               COUNT(vote.value) FILTER (WHERE vote.value < 0) AS down
+        FROM resource LEFT JOIN vote ON vote.resource_id = resource.id
+        GROUP BY resource.id
+    ) AS counts
+    WHERE resource.id = counts.id
+        AND (resource.upvotes, resource.downvotes, resource.rank)
+            <> (counts.up, counts.down, wilson_lower_bound(counts.up, counts.down))
+    """
+)
+
+
+class NoSuchResource(LookupError):
+    """Raised when voting on a resource that does not exist."""
+
+
+class VoteCounter:
+    """Accumulates changes to vote counters and flushes them to the database every
+    `interval` seconds, from a background thread running in an app context.
+    Changes not flushed yet are lost if the process is killed; `reconcile` fixes the
+    counters from the votes themselves.
+    """
+
+    def __init__(self, app: Flask, interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.app = app
+        self.interval = interval
+
+        self._pending: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="vote-counter", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def add(self, resource_id: int, value: VoteValue, count: int = 1):
+        """Count `count` more votes of `value` on a resource (or fewer, if negative)."""
+        with self._lock:
+            self._pending[resource_id][0 if value == VoteValue.UP else 1] += count
+
+    def flush(self) -> int:
+        """Apply the pending changes, returning the number of resources updated.
+        If the update fails, the changes are kept for the next flush.
+        """
+
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: [0, 0])
+        if not pending:
+            return 0
+
+        # Should this deadlock with another process' flush, it is simply retried.
+        ids = sorted(pending)
+        try:
+            with self.app.app_context():
+                try:
+                    db.session.execute(
+                        INCREMENT_COUNTERS,
+                        {
+                            "ids": ids,
+                            "ups": [pending[id_][0] for id_ in ids],
+                            "downs": [pending[id_][1] for id_ in ids],
+                        },
+                    )
+                    db.session.commit()
+                finally:
+                    db.session.remove()
+            response_cache.invalidate(Resource)
+        except Exception:
+            with self._lock:
+                for resource_id, (up, down) in pending.items():
+                    self._pending[resource_id][0] += up
+                    self._pending[resource_id][1] += down
+            raise
+
+        return len(ids)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                # Retried on the next flush.
+                pass
+
+    def stop(self):
+        """Stop the background thread, flushing the changes left."""
+        self._stopped.set()
+        self.flush()
+
+
+_counter: Optional[VoteCounter] = None
+_counter_lock = threading.Lock()
+
+
+def get_vote_counter(app: Flask, config: Optional[Mapping] = None) -> VoteCounter:
+    """Return the vote counter shared by the whole process, creating it on first use.
+    `config` is only read on creation, and may contain `VOTE_FLUSH_INTERVAL`.
+    """
+
+    global _counter
+
+    with _counter_lock:
+        if _counter is None:
+            config = config or {}
+            _counter = VoteCounter(
+                app,
+                interval=float(
+                    config.get("VOTE_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+                ),
+            )
+
+        return _counter
+
+
+def cast(
+    counter: VoteCounter, user_id: int, resource_id: int, value: VoteValue
+) -> bool:
+    """Record a vote, returning False if the user had already voted on the resource
+    (either way). Raises NoSuchResource if the resource does not exist.
+    """
+
+    voted = db.session.execute(
+        INSERT_VOTE,
+        {"user_id": user_id, "resource_id": resource_id, "value": value.value},
+    ).first()
+    db.session.commit()
+
+    if voted is None:
+        exists = db.session.execute(
+            text("SELECT 1 FROM resource WHERE id = :id"), {"id": resource_id}
+        ).first()
+        if exists is None:
+            raise NoSuchResource(resource_id)
+        return False
+
+    counter.add(resource_id, value)
+    return True
+
+
+def retract(
+    counter: VoteCounter, user_id: int, resource_id: int, value: VoteValue
+) -> bool:
+    """Remove a vote, returning False if the user had no such vote on the resource."""
+    removed = db.session.execute(
+        DELETE_VOTE,
+        {"user_id": user_id, "resource_id": resource_id, "value": value.value},
+    ).first()
+    db.session.commit()
+
+    if removed is None:
+        return False
+
+    counter.add(resource_id, value, -1)
+    return True
+
+
+def reconcile() -> int:
+    """Recount the votes of every resource, fixing counters that drifted, e.g. as
+    changes were lost or votes were deleted along with users. Returns the number of
+    resources fixed.
+    Changes still pending in running processes are added on top of the recounted
+    votes when flushed, so counters may be off by the votes of a few seconds until
+    the next reconciliation; run it when few votes are cast.
+    """
+
+    fixed = db.session.execute(RECONCILE_COUNTERS).rowcount
+    db.session.commit()
+    if fixed:
+        response_cache.invalidate(Resource)
+    return fixed